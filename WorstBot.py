@@ -1,4 +1,5 @@
 import asyncio
+from contextlib import asynccontextmanager
 import datetime
 import typing
 from typing import Any, Optional
@@ -7,7 +8,6 @@ import logging
 from logging import ERROR, INFO
 import pathlib
 import re
-from math import sqrt, floor
 
 import discord
 from discord import abc, app_commands, AppCommandType
@@ -22,6 +22,9 @@ from aiohttp import ClientSession, client_exceptions
 from dotenv import dotenv_values
 import orjson
 
+from modules import Snowflake
+from modules.Scheduler import Scheduler
+
 emoji_servers = (
     1099821517350637629,
     1099836627171430400,
@@ -29,6 +32,8 @@ emoji_servers = (
     1099836641570471946,
     1099836635627126876,
 )
+EVENT_TOGGLE_CHANNEL = "event_toggles"
+EVENT_LISTENER_RETRY = 5  # seconds between attempts to re-open a lost event toggle listener
 
 
 class _events(StrEnum):
@@ -50,12 +55,17 @@ class WorstBot(discord_commands.Bot):
         super().__init__(command_prefix, intents=intents, owner_id=owner_id, activity=activity, tree_cls=CommandTree)
         self.pool: Optional[asyncpg.Pool] = None
         self.session: Optional[ClientSession] = None
-        self._event_toggles = {}
+        self._event_toggles: dict[int, dict[str, bool]] = {}
+        self._event_listener: Optional[asyncpg.pool.PoolConnectionProxy] = None
+        self._event_listener_task: Optional[asyncio.Task] = None
         self._events = _events
+        self.statements: dict[str, str] = {}
+        self._prepared_statements: dict[asyncpg.Connection, dict[str, asyncpg.prepared_stmt.PreparedStatement]] = {}
         self.logger = logging.getLogger(self.__class__.__name__)
         self.cog_dir = pathlib.Path("./cogs")
         self.dotenv: dict[str, Optional[str]] = env_values
         self.custom_emoji: list[discord.Emoji] = []
+        self.scheduler = Scheduler(self.logger.getChild("scheduler"))
 
     async def setup_hook(self) -> None:
         self.pool = await asyncpg.create_pool(
@@ -65,11 +75,13 @@ class WorstBot(discord_commands.Bot):
             command_timeout=10,
             min_size=1,
             max_size=100,
+            init=self._init_connection,
             loop=self.loop,
         )
         self.session = ClientSession(loop=self.loop, json_serialize=lambda x: orjson.dumps(x).decode())
         self.prepare_mentions.start()
         self.load_emoji.start()
+        self.run_scheduler.start()
 
         sc = spotify.SpotifyClient(
             client_id=self.dotenv.get("spotify_id"), client_secret=self.dotenv.get("spotify_secret")
@@ -95,6 +107,16 @@ class WorstBot(discord_commands.Bot):
             except Exception as e:
                 self.logger.exception(f"Failed to load extension {extension}", exc_info=e)
 
+        await self.load_event_toggles()
+
+    async def close(self) -> None:
+        self.run_scheduler.cancel()
+        if self._event_listener_task is not None:
+            self._event_listener_task.cancel()
+        if self._event_listener is not None:
+            await self.release_event_listener()
+        await super().close()
+
     def collect_cogs(self, root: pathlib.Path) -> typing.Generator[pathlib.Path, None, None]:
         for file in root.iterdir():
             if file.match("[!-|_]*.py"):
@@ -126,20 +148,62 @@ class WorstBot(discord_commands.Bot):
         async with self.session.get(url=url, params=params, headers=headers) as response:
             return response.status
 
+    # Single statements run in their own implicit transaction, so reads skip the BEGIN/COMMIT round trips
     async def fetch(self, sql: str, *args) -> Optional[list[asyncpg.Record]]:
-        async with self.pool.acquire() as conn:
-            async with conn.transaction():
-                return await conn.fetch(sql, *args)
+        return await self.pool.fetch(sql, *args)
 
     async def fetchrow(self, sql: str, *args) -> Optional[asyncpg.Record]:
-        async with self.pool.acquire() as conn:
-            async with conn.transaction():
-                return await conn.fetchrow(sql, *args)
+        return await self.pool.fetchrow(sql, *args)
 
     async def fetchval(self, sql: str, *args) -> Optional[Any]:
+        return await self.pool.fetchval(sql, *args)
+
+    def register_statement(self, name: str, sql: str) -> None:
+        """Declares a named query that is prepared once per pooled connection and executed by name
+
+        :param name: Unique name, conventionally "<cog>.<query>"
+        :param sql: Query text
+        """
+        if self.statements.get(name, sql) != sql:  # changed by a hot reload, drop the stale prepared copies
+            for statements in self._prepared_statements.values():
+                statements.pop(name, None)
+        self.statements[name] = sql
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        self._prepared_statements[conn] = {name: await conn.prepare(sql) for name, sql in self.statements.items()}
+        # prepared statements reference their connection, so the entry is dropped explicitly rather than weakly
+        conn.add_termination_listener(lambda _: self._prepared_statements.pop(conn, None))
+
+    async def prepared(
+        self, conn: asyncpg.Connection | asyncpg.pool.PoolConnectionProxy, name: str
+    ) -> asyncpg.prepared_stmt.PreparedStatement:
+        """Returns the connection's copy of a registered statement, for use inside bot.transaction()"""
+        if isinstance(conn, asyncpg.pool.PoolConnectionProxy):
+            conn = conn._con  # the proxy is shared by every holder of the slot, the connection behind it is not
+        statements = self._prepared_statements[conn]  # every pooled connection is keyed by _init_connection
+        if name not in statements:  # registered after this connection was opened
+            statements[name] = await conn.prepare(self.statements[name])
+        return statements[name]
+
+    async def fetch_prepared(self, name: str, *args) -> list[asyncpg.Record]:
         async with self.pool.acquire() as conn:
-            async with conn.transaction():
-                return await conn.fetchval(sql, *args)
+            return await (await self.prepared(conn, name)).fetch(*args)
+
+    async def fetchrow_prepared(self, name: str, *args) -> Optional[asyncpg.Record]:
+        async with self.pool.acquire() as conn:
+            return await (await self.prepared(conn, name)).fetchrow(*args)
+
+    async def fetchval_prepared(self, name: str, *args) -> Optional[Any]:
+        async with self.pool.acquire() as conn:
+            return await (await self.prepared(conn, name)).fetchval(*args)
+
+    async def execute_prepared(self, name: str, *args) -> Optional[Any]:
+        async with self.pool.acquire() as conn:
+            return await (await self.prepared(conn, name)).fetchval(*args)
+
+    async def executemany_prepared(self, name: str, args: typing.Iterable[typing.Sequence]) -> None:
+        async with self.pool.acquire() as conn:
+            await (await self.prepared(conn, name)).executemany(args)
 
     async def execute(self, sql: str, *args) -> Optional[Any]:
         async with self.pool.acquire() as conn:
@@ -151,6 +215,13 @@ class WorstBot(discord_commands.Bot):
             async with conn.transaction():
                 return await conn.executemany(sql, args)
 
+    @asynccontextmanager
+    async def transaction(self) -> typing.AsyncIterator[asyncpg.Connection]:
+        """Yields a pooled connection inside a transaction, for statements that must succeed or fail together"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
     async def maybe_fetch_guild(self, guild_id: int) -> Optional[discord.Guild]:
         try:
             return self.get_guild(guild_id) or await self.fetch_guild(guild_id)
@@ -189,26 +260,90 @@ class WorstBot(discord_commands.Bot):
     def current(current: str) -> typing.Literal["%"] | str:
         return "%" if not current else current
 
-    async def events(self, guild_int: int, event: _events) -> bool:
-        """Returns True/False to determine if event is enabled in guild"""
-        if not self._event_toggles.get(guild_int):  # Adds guild to cache with no events
-            self._event_toggles[guild_int] = {}
+    async def load_event_toggles(self) -> None:
+        """Caches every guild's event toggles in one query and listens for changes made by other processes"""
+        if self._event_listener is None:  # listen first, so a change made while loading is not missed
+            self._event_listener = await self.pool.acquire()
+            await self._event_listener.add_listener(EVENT_TOGGLE_CHANNEL, self._on_event_toggle_notify)
+            self._event_listener.add_termination_listener(self._on_event_listener_terminated)
+        try:
+            rows = await self.fetch("SELECT * FROM events")
+        except asyncpg.UndefinedTableError:
+            rows = []
+        self._event_toggles = {}
+        for row in rows:
+            self.cache_event_toggles(row)
+        self.logger.info(f"Loaded event toggles for {len(self._event_toggles)} guilds")
+
+    async def release_event_listener(self) -> None:
+        listener, self._event_listener = self._event_listener, None
+        listener.remove_termination_listener(self._on_event_listener_terminated)
+        if not listener.is_closed():
+            await listener.remove_listener(EVENT_TOGGLE_CHANNEL, self._on_event_toggle_notify)
+        await self.pool.release(listener)  # the pool discards a closed connection and opens a fresh one later
+
+    def _on_event_listener_terminated(self, connection: asyncpg.Connection) -> None:
+        if self.is_closed():
+            return
+        self.logger.warning("Event toggle listener connection lost, reconnecting")
+        if self._event_listener_task is None or self._event_listener_task.done():
+            self._event_listener_task = self.loop.create_task(self.relisten_event_toggles())
+
+    async def relisten_event_toggles(self) -> None:
+        """Replaces a lost listener connection and reloads every toggle, since notifications sent meanwhile are gone"""
+        if self._event_listener is not None:
+            await self.release_event_listener()
+        while not self.is_closed():
+            try:
+                await self.load_event_toggles()
+                return
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                if self._event_listener is not None:  # listening worked but the reload failed, start over next time
+                    await self.release_event_listener()
+                self.logger.warning(f"Failed to re-open the event toggle listener: {e!r}")
+                await asyncio.sleep(EVENT_LISTENER_RETRY)
+
+    def cache_event_toggles(self, row: asyncpg.Record) -> None:
+        toggles = dict(row)
+        self._event_toggles[toggles.pop("guild")] = toggles
+
+    async def refresh_event_toggles(self, guild_id: int) -> None:
+        row = await self.fetchrow("SELECT * FROM events WHERE guild = $1", guild_id)
+        if row:
+            self.cache_event_toggles(row)
+        else:
+            self._event_toggles[guild_id] = {}
+
+    async def notify_event_toggles(self, guild_id: int) -> None:
+        """Tells every process listening on the database to refresh the guild's event toggles"""
+        await self.execute("SELECT pg_notify($1, $2)", EVENT_TOGGLE_CHANNEL, str(guild_id))
+
+    def _on_event_toggle_notify(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            guild_id = int(payload)
+        except ValueError:
+            self.logger.warning(f"Ignoring malformed event toggle notification: {payload}")
+            return
+        self.loop.create_task(self.refresh_event_toggles(guild_id))
 
-        if self._event_toggles[guild_int].get(event.name) is None:  # Adds event to guild on request
-            toggle_value = await self.fetchval(f"SELECT {event.name} FROM events WHERE guild = $1", guild_int)
-            self._event_toggles[guild_int][event.name] = toggle_value
+    async def events(self, guild_int: int, event: _events) -> Optional[bool]:
+        """Returns True/False to determine if event is enabled in guild, None if the guild has no settings"""
+        toggles = self._event_toggles.get(guild_int)
+        if toggles is None:  # only guilds missing from the bulk load reach the database
+            await self.refresh_event_toggles(guild_int)
+            toggles = self._event_toggles[guild_int]
 
-        return self._event_toggles[guild_int][event.name]  # returns event bool
+        return toggles.get(event.name)
 
     @staticmethod
     def pair(guild_id: int, member_id: int) -> int:
-        """Returns a unique id for a guild and member using cantor pairing function
+        """Returns a unique id for a guild and member by packing both 64 bit snowflakes into one int
 
         :param guild_id: Guild to pair
         :param member_id: Member to pair
         :return: combined id
         """
-        return int((((guild_id + member_id) * (guild_id + member_id + 1)) / 2) + member_id)
+        return Snowflake.pair(guild_id, member_id)
 
     def unpair(self, pair: int, get_objects: bool = True) -> tuple[Optional[discord.Guild], Optional[discord.Member]]:
         """Returns the guild and member from a paired id
@@ -217,9 +352,7 @@ class WorstBot(discord_commands.Bot):
         :param get_objects: Whether to attempt to get the objects from the cache
         :return: guild, member
         """
-        w = floor((sqrt(8 * pair + 1) - 1) / 2)
-        y = int(pair - (w**2 + w) / 2)
-        x = int(w - y)
+        x, y = Snowflake.unpair(pair)
         return (self.get_guild(x), self.get_user(y)) if get_objects else (x, y)
 
     @staticmethod
@@ -255,9 +388,15 @@ class WorstBot(discord_commands.Bot):
                 self.custom_emoji.append(emoji)
                 self.logger.debug(f"Loaded {emoji.name}:{emoji.id} from {guild.name}")
         self.logger.info(f"Loaded {len(self.custom_emoji)} custom emoji")
+        self.dispatch("emoji_loaded")
+
+    @tasks.loop(count=1)
+    async def run_scheduler(self):
+        await self.scheduler.run()
 
     @prepare_mentions.before_loop
     @load_emoji.before_loop
+    @run_scheduler.before_loop
     async def before_prepare_mentions(self):
         await self.wait_until_ready()
 
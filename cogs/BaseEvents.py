@@ -49,22 +49,26 @@ class BaseEvents(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         if not await self.bot.fetchval("SELECT EXISTS(SELECT 1 FROM events WHERE guild = $1)", interaction.guild_id):
             await self.on_guild_join(interaction.guild)
-        toggle = await self.bot.execute(
-            f"UPDATE events SET {event.name} = NOT {event.name} WHERE guild = $1 RETURNING {event.name}",
+        row = await self.bot.fetchrow(
+            f"UPDATE events SET {event.name} = NOT {event.name} WHERE guild = $1 RETURNING *",
             interaction.guild_id,
         )
-        if self.bot._event_toggles.get(interaction.guild_id):
-            self.bot._event_toggles.pop(interaction.guild_id)
+        self.bot.cache_event_toggles(row)
+        await self.bot.notify_event_toggles(interaction.guild_id)
 
-        await interaction.followup.send(f"{event.name} set to: {toggle}", ephemeral=True)
+        await interaction.followup.send(f"{event.name} set to: {row[event.name]}", ephemeral=True)
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
-        await self.bot.execute("INSERT INTO events(guild) VALUES($1)", guild.id)
+        row = await self.bot.fetchrow("INSERT INTO events(guild) VALUES($1) RETURNING *", guild.id)
+        self.bot.cache_event_toggles(row)
+        await self.bot.notify_event_toggles(guild.id)
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild):
         await self.bot.execute("DELETE FROM events WHERE guild = $1", guild.id)
+        self.bot._event_toggles.pop(guild.id, None)
+        await self.bot.notify_event_toggles(guild.id)
 
 
 async def setup(bot):
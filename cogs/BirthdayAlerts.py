@@ -15,7 +15,8 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
 
     def __init__(self, bot: WorstBot):
         self.bot = bot
-        self.birthdays: dict[discord.User, date] | None = None
+        self.birthdays: dict[int, date] | None = None
+        self.birthday_index: dict[date, set[int]] = {}
         self.logger = self.bot.logger.getChild(self.qualified_name)
 
     async def cog_load(self) -> None:
@@ -24,6 +25,7 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
         )
         await self.bot.execute("CREATE TABLE IF NOT EXISTS birthdays(member BIGINT PRIMARY KEY, birthday DATE)")
         self.birthdays = {}
+        self.birthday_index = {}
         self.populate_birthdays.start()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
@@ -32,6 +34,20 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
         self.birthday_check.stop()
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
+    def set_birthday(self, user_id: int, birthday: date) -> None:
+        self.remove_birthday(user_id)
+        self.birthdays[user_id] = birthday
+        self.birthday_index.setdefault(birthday, set()).add(user_id)
+
+    def remove_birthday(self, user_id: int) -> None:
+        birthday = self.birthdays.pop(user_id, None)
+        if birthday is None:
+            return
+        bucket = self.birthday_index.get(birthday, set())
+        bucket.discard(user_id)
+        if not bucket:
+            self.birthday_index.pop(birthday, None)
+
     @app_commands.command(name="alert")
     async def BirthdayAdd(
         self, interaction: Interaction, month: Range[int, 1, 12] = None, day: Range[int, 1, 31] = None
@@ -44,7 +60,7 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
         """
         if not (month and day):
             await self.bot.execute("DELETE FROM birthdays WHERE member = $1", interaction.user.id)
-            self.birthdays.pop(interaction.user, None)
+            self.remove_birthday(interaction.user.id)
             return await interaction.response.send_message(f"Birthday alert removed", ephemeral=True)
         birthday = date(year=date.today().year, month=month, day=day)
         if birthday < date.today():
@@ -54,7 +70,7 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
             interaction.user.id,
             birthday,
         )
-        self.birthdays[interaction.user] = birthday
+        self.set_birthday(interaction.user.id, birthday)
         await interaction.response.send_message(
             f"you will be alerted of your birthday on {birthday.strftime('%d/%m/%Y')}", ephemeral=True
         )
@@ -66,11 +82,11 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
         :param interaction: Internal interaction
         """
         birthdays = [""]
-        for user, birthday in self.birthdays.items():
-            if user not in interaction.guild.members:
+        for user_id, birthday in self.birthdays.items():
+            if interaction.guild.get_member(user_id) is None:
                 continue
 
-            string = f"{user.mention}: {birthday.strftime('%d/%m')}\n"
+            string = f"<@{user_id}>: {birthday.strftime('%d/%m')}\n"
             if len(birthdays[-1] + string) < 4000:
                 birthdays[-1] += string
             else:
@@ -83,39 +99,40 @@ class BirthdayAlert(commands.GroupCog, name="birthday"):
 
     @tasks.loop(count=1)
     async def populate_birthdays(self):
-        table = await self.bot.fetch("SELECT * FROM birthdays")
-        for user_id, birthday in table:
-            user = await self.bot.maybe_fetch_user(user_id)
-            self.birthdays[user] = birthday
-        self.logger.debug(self.birthdays)
+        for user_id, birthday in await self.bot.fetch("SELECT * FROM birthdays"):
+            self.set_birthday(user_id, birthday)
+        self.logger.debug(f"Loaded {len(self.birthdays)} birthdays")
 
     @tasks.loop(hours=1)
     async def birthday_check(self):
-        birthday_channels = await self.bot.fetch("SELECT * FROM birthdaychannel")
-        if not birthday_channels:
+        today = discord.utils.utcnow().date()
+        user_ids = set(self.birthday_index.get(today, ()))  # snapshot, /birthday may edit the bucket mid-send
+        if not user_ids:
             return
-        birthday_channels = {
-            await self.bot.maybe_fetch_guild(guild_id): await self.bot.maybe_fetch_channel(channel_id)
-            for guild_id, channel_id in birthday_channels
-        }
-        for user, birthday in self.birthdays.items():  # type: discord.User, date
-            if birthday != discord.utils.utcnow().date():
+
+        for guild_id, channel_id in await self.bot.fetch("SELECT * FROM birthdaychannel"):
+            guild = self.bot.get_guild(guild_id)
+            channel = guild and guild.get_channel(channel_id)
+            if not channel:
+                continue
+            permissions = channel.permissions_for(guild.me)
+            if not (permissions.send_messages and permissions.view_channel):
                 continue
 
-            for guild, channel in birthday_channels.items():  # type: discord.Guild, discord.TextChannel
-                if user not in guild.members:
+            for user_id in user_ids:
+                if guild.get_member(user_id) is None:
                     continue
+                await channel.send(
+                    f"Today is <@{user_id}>'s birthday, dont forget to send them a happy birthday message"
+                )
 
-                permissions = channel.permissions_for(guild.me)
-                if permissions.send_messages and permissions.view_channel:
-                    await channel.send(
-                        f"Today is {user.mention}'s birthday, dont forget to send them a happy birthday message"
-                    )
-
-            await self.bot.execute(
-                "UPDATE birthdays SET birthday = birthday + INTERVAL '1 year' WHERE member = $1", user.id
-            )
-            self.birthdays[user] += relativedelta(years=1)
+        user_ids = [user_id for user_id in user_ids if self.birthdays.get(user_id) == today]  # skip changed birthdays
+        await self.bot.execute(
+            "UPDATE birthdays SET birthday = birthday + INTERVAL '1 year' WHERE member = ANY($1::BIGINT[])",
+            user_ids,
+        )
+        for user_id in user_ids:
+            self.set_birthday(user_id, today + relativedelta(years=1))
 
     @populate_birthdays.before_loop
     async def before_birthdays(self):
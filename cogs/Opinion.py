@@ -2,14 +2,56 @@ import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 from WorstBot import WorstBot
-from re import sub
-from asyncio import sleep
+import re
+from asyncio import Lock, Queue, QueueEmpty, shield, sleep
+from datetime import datetime, timedelta
+from random import randrange
+from typing import Optional
+from discord.utils import utcnow
+
+URL_PATTERN = re.compile(r"http\S+")
+EMOJI_PATTERN = re.compile(r"<(?P<animated>a?):(?P<name>\w{2,32}):(?P<id>\d{18,22})>")
+RESERVOIR_SIZE = 500
+RETENTION = timedelta(weeks=2)
+
+
+class Reservoir:
+    """Fixed size uniform sample of every opinion a guild has produced since it was seeded"""
+
+    __slots__ = ("seen", "items")
+
+    def __init__(self, items: list[tuple[datetime, str]], seen: int):
+        self.items = items
+        self.seen = seen
+
+    def add(self, item: tuple[datetime, str]) -> None:
+        self.seen += 1
+        if len(self.items) < RESERVOIR_SIZE:
+            self.items.append(item)
+            return
+        index = randrange(self.seen)
+        if index < RESERVOIR_SIZE:
+            self.items[index] = item
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def expired(self, cutoff: datetime) -> bool:
+        # dropping entries in place would skew the sample towards new opinions, so stale reservoirs are reseeded instead
+        return any(timestamp < cutoff for timestamp, _ in self.items)
+
+    def sample(self) -> Optional[str]:
+        return self.items[randrange(len(self.items))][1] if self.items else None
 
 
 class Opinion(commands.Cog):
     def __init__(self, bot: WorstBot):
         self.bot = bot
         self.logger = self.bot.logger.getChild(self.qualified_name)
+        self.prefixes: dict[int, tuple[str, ...]] = {}
+        self.queue: Queue[tuple[int, datetime, str]] = Queue()
+        self.flush_lock = Lock()
+        self.reservoirs: dict[int, Reservoir] = {}
 
     async def cog_load(self) -> None:
         await self.bot.execute(
@@ -18,13 +60,47 @@ class Opinion(commands.Cog):
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS PrefixBlacklist(guild BIGINT NOT NULL, prefix TEXT NOT NULL)"
         )
+        await self.bot.execute("CREATE INDEX IF NOT EXISTS opinion_guild_timestamp ON Opinion(guild, timestamp)")
+        self.bot.register_statement(
+            "opinion.insert", "INSERT INTO opinion(guild, timestamp, content) VALUES ($1, $2, $3)"
+        )
+        self.bot.register_statement(
+            "opinion.sample",
+            "SELECT timestamp, content, COUNT(*) OVER () AS total FROM Opinion WHERE guild = $1 AND timestamp >= $2 ORDER BY random() LIMIT $3",
+        )
+        for row in await self.bot.fetch(
+            "SELECT guild, ARRAY_AGG(prefix) AS prefixes FROM PrefixBlacklist GROUP BY guild"
+        ):
+            self.prefixes[row["guild"]] = tuple(row["prefixes"])
         self.DeleteOld.start()
+        self.FlushOpinions.start()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
         self.DeleteOld.stop()
+        self.FlushOpinions.cancel()
+        await self.flush()
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
+    async def flush(self) -> None:
+        """Writes every queued opinion to the database in one batch"""
+        async with self.flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except QueueEmpty:
+                    break
+            if not batch:
+                return
+            try:
+                await self.bot.executemany_prepared("opinion.insert", batch)
+            except BaseException:  # includes cancellation, so unload can't drop the batch
+                for opinion in batch:
+                    self.queue.put_nowait(opinion)
+                raise
+        self.logger.debug(f"Flushed {len(batch)} opinions")
+
     @commands.Cog.listener()
     async def on_message(self, message):
         if not message.channel.guild:
@@ -33,25 +109,32 @@ class Opinion(commands.Cog):
             return
         if await self.bot.events(message.guild.id, self.bot._events.opinion) is False:
             return
-        prefixes = await self.bot.fetch("SELECT prefix FROM PrefixBlacklist WHERE guild = $1", message.guild.id)
-        if any(message.content.startswith(prefix["prefix"]) for prefix in prefixes):
+        if message.content.startswith(self.prefixes.get(message.guild.id, ())):
             return
 
-        content = sub(r"http\S+", "", message.clean_content)
-        content = sub(r"<(?P<animated>a?):(?P<name>\w{2,32}):(?P<id>\d{18,22})>", "", content)
-        await self.bot.execute(
-            "INSERT INTO opinion(guild, timestamp, content) VALUES ($1, $2, $3)",
-            message.guild.id,
-            message.created_at,
-            content,
+        content = URL_PATTERN.sub("", message.clean_content)
+        content = EMOJI_PATTERN.sub("", content)
+        self.queue.put_nowait((message.guild.id, message.created_at, content))
+        if (reservoir := self.reservoirs.get(message.guild.id)) is not None:
+            reservoir.add((message.created_at, content))
+
+    async def get_reservoir(self, guild_id: int) -> Reservoir:
+        """Returns the guild's opinion sample, seeding it from the database on first use or once it is empty or stale"""
+        cutoff = utcnow() - RETENTION
+        reservoir = self.reservoirs.get(guild_id)
+        if reservoir is not None and len(reservoir) and not reservoir.expired(cutoff):
+            return reservoir
+        await self.flush()
+        rows = await self.bot.fetch_prepared("opinion.sample", guild_id, cutoff, RESERVOIR_SIZE)
+        reservoir = self.reservoirs[guild_id] = Reservoir(
+            [(row["timestamp"], row["content"]) for row in rows], rows[0]["total"] if rows else 0
         )
+        return reservoir
 
     @app_commands.command(name="opinion", description="Ask worst bot for its opinion on your super important questions")
     @app_commands.guild_only()
     async def opinion(self, interaction: discord.Interaction, opinion: str = None):
-        content = await self.bot.fetchval(
-            "SELECT content FROM Opinion WHERE GUILD=$1 ORDER BY random() LIMIT 1", interaction.guild.id
-        )
+        content = (await self.get_reservoir(interaction.guild.id)).sample()
         await interaction.response.send_message(
             content=f"what is my opinion on `{opinion}`?\n\n{content or 'I have no opinions'}"
         )
@@ -65,11 +148,22 @@ class Opinion(commands.Cog):
         await self.bot.execute(
             "INSERT INTO prefixblacklist(guild, prefix) VALUES ($1, $2)", interaction.guild_id, prefix
         )
+        self.prefixes[interaction.guild_id] = (*self.prefixes.get(interaction.guild_id, ()), prefix)
         await interaction.response.send_message(f"messages starting with {prefix} will be ignored", ephemeral=True)
 
     @tasks.loop(hours=24, reconnect=True)
     async def DeleteOld(self):
         await self.bot.execute("DELETE FROM opinion WHERE timestamp < CURRENT_TIMESTAMP - INTERVAL '2 weeks'")
+        cutoff = utcnow() - RETENTION
+        for guild_id in [guild_id for guild_id, reservoir in self.reservoirs.items() if reservoir.expired(cutoff)]:
+            del self.reservoirs[guild_id]  # reseeded from the remaining rows on next use
+
+    @tasks.loop(seconds=5)
+    async def FlushOpinions(self):
+        try:
+            await shield(self.flush())  # cancelling the loop on unload can't abort a write, the final flush waits on it
+        except Exception as e:
+            self.logger.exception("Failed to flush opinions", exc_info=e)
 
     @DeleteOld.before_loop
     async def BeforeDeleteOld(self):
@@ -1,9 +1,25 @@
+import asyncio
+
 import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
 from WorstBot import WorstBot
 from modules import EmbedGen, Constants
-from io import BytesIO
+from dataclasses import dataclass, field
+from gzip import GzipFile
+from tempfile import SpooledTemporaryFile
+from typing import Optional
+
+TEXT_ARCHIVE_ENABLED = False  # Disabled until message intent re-enabled
+ARCHIVE_SPOOL_SIZE = 1024 * 1024  # bytes held in memory before an archive part spills to disk
+ARCHIVE_SIZE_MARGIN = 1024 * 1024  # headroom below the upload limit for data still inside the compressor
+
+
+@dataclass(slots=True)
+class CallConfig:
+    base_call: Optional[int] = None
+    protected: frozenset[int] = field(default_factory=frozenset)
+    blacklist: frozenset[int] = field(default_factory=frozenset)
 
 
 @app_commands.default_permissions(manage_channels=True, ban_members=True)
@@ -14,6 +30,8 @@ class PersonalCalls(commands.GroupCog, name="personal-call"):
         super().__init__()
         self.bot = bot
         self.logger = self.bot.logger.getChild(self.qualified_name)
+        self.configs: dict[int, CallConfig] = {}
+        self.archives: dict[int, asyncio.Task] = {}  # personal call id -> its running archive
 
     async def cog_load(self) -> None:
         await self.bot.execute("CREATE TABLE IF NOT EXISTS personalcall(guild BIGINT UNIQUE, channel BIGINT UNIQUE)")
@@ -21,40 +39,103 @@ class PersonalCalls(commands.GroupCog, name="personal-call"):
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS userblacklist(guild BIGINT NOT NULL, member BIGINT NOT NULL)"
         )
+        await self.load_configs()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
+        for task in self.archives.values():
+            task.cancel()  # the channel is only deleted after a finished archive, so nothing is lost
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
+    async def load_configs(self) -> None:
+        for row in await self.bot.fetch("SELECT guild, channel FROM personalcall"):
+            self.config(row["guild"]).base_call = row["channel"]
+        for row in await self.bot.fetch(
+            "SELECT guild, ARRAY_AGG(channel) AS channels FROM callblacklist GROUP BY guild"
+        ):
+            self.config(row["guild"]).protected = frozenset(row["channels"])
+        for row in await self.bot.fetch("SELECT guild, ARRAY_AGG(member) AS members FROM userblacklist GROUP BY guild"):
+            self.config(row["guild"]).blacklist = frozenset(row["members"])
+
+    def config(self, guild_id: int) -> CallConfig:
+        if guild_id not in self.configs:
+            self.configs[guild_id] = CallConfig()
+        return self.configs[guild_id]
+
     @staticmethod
-    async def text_archive(base_call: discord.VoiceChannel, personal_channel: discord.VoiceChannel) -> None:
-        bytesIO = BytesIO()
-        bytesIO.writelines(
-            [
-                f"{message.created_at.strftime('%Y-%m-%d %H:%M:%S')} | {message.author} : {message.content}\n"
-                async for message in personal_channel.history(limit=None)
-            ]
-        )
-        bytesIO.seek(0)
-        await base_call.send(file=discord.File(filename=f"{personal_channel.name} archive.txt", fp=bytesIO))
+    async def send_archive_part(
+        base_call: discord.VoiceChannel, buffer: SpooledTemporaryFile, name: str, part: int
+    ) -> None:
+        buffer.seek(0)
+        await base_call.send(file=discord.File(filename=f"{name} archive part {part}.txt.gz", fp=buffer))
+
+    async def text_archive(self, base_call: discord.VoiceChannel, personal_channel: discord.VoiceChannel) -> None:
+        """Streams the channel's history into gzip attachments, starting a new part before the upload limit"""
+        part_limit = base_call.guild.filesize_limit - ARCHIVE_SIZE_MARGIN
+        part, written = 1, False
+        buffer = SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+        archive = GzipFile(fileobj=buffer, mode="wb")
+        try:
+            async for message in personal_channel.history(limit=None, oldest_first=True):
+                line = f"{message.created_at.strftime('%Y-%m-%d %H:%M:%S')} | {message.author} : {message.content}\n"
+                archive.write(line.encode())
+                written = True
+                if buffer.tell() < part_limit:
+                    continue
+                archive.close()
+                await self.send_archive_part(base_call, buffer, personal_channel.name, part)
+                buffer.close()
+                part, written = part + 1, False
+                buffer = SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+                archive = GzipFile(fileobj=buffer, mode="wb")
+
+            archive.close()
+            if written:
+                await self.send_archive_part(base_call, buffer, personal_channel.name, part)
+        finally:
+            archive.close()
+            buffer.close()
+
+    async def archive_and_delete(self, base_call: discord.VoiceChannel, channel: discord.VoiceChannel) -> None:
+        """Deletes the channel once its history is archived, keeping it if the archive fails or someone rejoined"""
+        try:
+            try:
+                await self.text_archive(base_call, channel)
+            except Exception as e:
+                self.logger.exception(f"failed to archive {channel}, keeping the channel", exc_info=e)
+                return
+
+            if channel.members:
+                self.logger.debug(f"{channel} was rejoined while archiving")
+                return
+            self.logger.debug(f"deleting {channel}")
+            try:
+                await channel.delete()
+            except discord.HTTPException as e:
+                self.logger.exception(f"failed to delete {channel}", exc_info=e)
+        finally:
+            self.archives.pop(channel.id, None)
 
     @commands.Cog.listener()
     async def on_voice_state_update(
         self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState
     ):
+        if before.channel == after.channel:  # mute, deafen and stream toggles
+            return
+        config = self.configs.get(member.guild.id)
+        if config is None or config.base_call is None:
+            self.logger.debug(f"{member.guild.id} does not have a base call set")
+            return
         if await self.bot.events(member.guild.id, self.bot._events.calls) is False:
             self.logger.debug(f"{member.guild.id} does not have calls enabled")
             return
 
-        channel_id = await self.bot.fetchval("SELECT channel FROM personalcall WHERE guild=$1", member.guild.id)
-        base_call: discord.VoiceChannel = await self.bot.maybe_fetch_channel(channel_id)  # type: Ignore
+        base_call: discord.VoiceChannel = member.guild.get_channel(config.base_call)  # type: ignore
         if base_call is None:
-            self.logger.debug(f"{member.guild.id} does not have a base call set")
+            self.logger.debug(f"{member.guild.id} base call {config.base_call} no longer exists")
             return
 
-        call_blacklist = await self.bot.fetch("SELECT channel FROM callblacklist WHERE guild=$1", member.guild.id)
-        user_blacklist = await self.bot.fetch("SELECT member FROM userblacklist WHERE guild=$1", member.guild.id)
-        if any(member.id == record["member"] for record in user_blacklist):
+        if member.id in config.blacklist:
             self.logger.debug(f"{member} is blacklisted from personal calls")
             await member.edit(voice_channel=None)
 
@@ -66,13 +147,19 @@ class PersonalCalls(commands.GroupCog, name="personal-call"):
             await member.move_to(personal_call, reason="WorstBot Personal Calls")
 
         if before.channel not in (base_call, None):
-            if any(before.channel.id == record["channel"] for record in call_blacklist) or before.channel.members:
+            if before.channel.id in config.protected or before.channel.members:
                 self.logger.debug(f"{before.channel} is protected or has members")
                 return
+            if before.channel.id in self.archives:
+                self.logger.debug(f"{before.channel} is already being archived")
+                return
 
-            # if await self.bot.events(member.guild.id, self.bot._events.textarchive):  # Disabled until message intent re-enabled
-            #     self.logger.debug(f"archiving {before.channel} messages")
-            #     await self.text_archive(base_call, before.channel)
+            if TEXT_ARCHIVE_ENABLED and await self.bot.events(member.guild.id, self.bot._events.textarchive):
+                self.logger.debug(f"archiving {before.channel} messages")
+                self.archives[before.channel.id] = self.bot.loop.create_task(
+                    self.archive_and_delete(base_call, before.channel)
+                )
+                return
             self.logger.debug(f"deleting {before.channel}")
             await before.channel.delete()
 
@@ -85,12 +172,15 @@ class PersonalCalls(commands.GroupCog, name="personal-call"):
         :return:
         """
         if not channel:
-            await self.bot.execute("DELETE FROM personalcall WHERE channel = $1", channel.id)
+            await self.bot.execute("DELETE FROM personalcall WHERE guild = $1", interaction.guild_id)
+            self.config(interaction.guild_id).base_call = None
+            return await interaction.response.send_message("personal calls have been disabled", ephemeral=True)
         await self.bot.execute(
             "INSERT INTO PersonalCall(guild, channel) VALUES($1, $2) ON CONFLICT (guild) DO UPDATE SET channel = EXCLUDED.channel",
             interaction.guild.id,
             channel.id,
         )
+        self.config(interaction.guild_id).base_call = channel.id
         await interaction.response.send_message(f"the new base voice call is {channel}", ephemeral=True)
 
     @app_commands.command(name="protect")
@@ -101,17 +191,16 @@ class PersonalCalls(commands.GroupCog, name="personal-call"):
         :param channel: The channel to protect
         :return:
         """
-        if not await self.bot.fetchval(
-            "SELECT EXISTS(SELECT 1 FROM callblacklist WHERE guild = $1 AND channel = $2)",
-            interaction.guild_id,
-            channel.id,
-        ):
+        config = self.config(interaction.guild_id)
+        if channel.id not in config.protected:
             await self.bot.execute(
                 "INSERT INTO CallBlacklist(guild, channel) VALUES($1, $2)", interaction.guild_id, channel.id
             )
+            config.protected |= {channel.id}
             await interaction.response.send_message(f"{channel} is now protected", ephemeral=True)
         else:
             await self.bot.execute("DELETE FROM CallBlacklist WHERE channel=$1", channel.id)
+            config.protected -= {channel.id}
             await interaction.response.send_message(f"{channel} is no longer protected", ephemeral=True)
 
     @app_commands.command(name="protection-list")
@@ -143,21 +232,20 @@ class PersonalCalls(commands.GroupCog, name="personal-call"):
         :param member: The member to add/remove from the blacklist
         :return:
         """
-        if not await self.bot.fetchval(
-            "SELECT EXISTS(SELECT 1 FROM UserBlacklist WHERE guild = $1 AND member = $2)",
-            interaction.guild_id,
-            member.id,
-        ):
+        config = self.config(interaction.guild_id)
+        if member.id not in config.blacklist:
             await self.bot.execute(
                 "INSERT INTO UserBlacklist(guild, member) VALUES($1, $2) ON CONFLICT DO NOTHING",
                 interaction.guild_id,
                 member.id,
             )
+            config.blacklist |= {member.id}
             await interaction.response.send_message(f"{str(member)} has been added to the blacklist", ephemeral=True)
         else:
             await self.bot.execute(
                 "DELETE FROM UserBlacklist WHERE guild = $1 AND member = $2", interaction.guild_id, member.id
             )
+            config.blacklist -= {member.id}
             await interaction.response.send_message(
                 f"{str(member)} has been removed from the blacklist", ephemeral=True
             )
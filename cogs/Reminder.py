@@ -1,9 +1,11 @@
 import discord
 from discord import app_commands, utils
 from discord.app_commands import Range
-from discord.ext import commands, tasks
+from discord.ext import commands
 from WorstBot import WorstBot
-from datetime import datetime as dt, timezone
+from datetime import datetime as dt
+from functools import partial
+from asyncpg import Record
 from modules.EmbedGen import FullEmbed, EmbedField
 
 
@@ -16,12 +18,19 @@ class Reminder(commands.Cog):
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS reminder(guild BIGINT NOT NULL, member BIGINT NOT NULL, creationtime TIMESTAMP WITH TIME ZONE NOT NULL, expiretime TIMESTAMP WITH TIME ZONE NOT NULL,message TEXT NOT NULL, jumplink TEXT NOT NULL)"
         )
+        for reminder in await self.bot.fetch("SELECT * FROM reminder"):
+            self.schedule(reminder)
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
-        self.ReminderTask.stop()
+        self.bot.scheduler.cancel_namespace("reminder")
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
+    def schedule(self, reminder: Record) -> None:
+        self.bot.scheduler.schedule(
+            ("reminder", reminder["jumplink"]), reminder["expiretime"], partial(self.send_reminder, reminder)
+        )
+
     @app_commands.command(
         name="remindme", description="Set a DM reminder for all your important things (all fields are optional)"
     )
@@ -66,8 +75,8 @@ class Reminder(commands.Cog):
             ephemeral=True,
         )
         response = await interaction.original_response()
-        await self.bot.execute(
-            "INSERT INTO reminder(guild, member, creationtime, expiretime,message, jumplink) VALUES($1, $2, $3, $4, $5, $6)",
+        reminder = await self.bot.fetchrow(
+            "INSERT INTO reminder(guild, member, creationtime, expiretime,message, jumplink) VALUES($1, $2, $3, $4, $5, $6) RETURNING *",
             interaction.guild.id,
             interaction.user.id,
             interaction.created_at,
@@ -75,37 +84,19 @@ class Reminder(commands.Cog):
             message,
             response.jump_url,
         )
-        if self.ReminderTask.is_running():
-            self.ReminderTask.restart()
-        else:
-            self.ReminderTask.start()
-
-    @tasks.loop(seconds=30, reconnect=True)
-    async def ReminderTask(self):
-        reminder = await self.bot.fetchrow(
-            "SELECT * FROM reminder WHERE expiretime = (SELECT MIN(expiretime) FROM reminder)"
-        )
-
-        if not reminder:
-            return
+        self.schedule(reminder)
 
-        if (reminder["expiretime"] - dt.now(timezone.utc)).days > 7:
-            return
-
-        await discord.utils.sleep_until(reminder["expiretime"])
+    async def send_reminder(self, reminder: Record) -> None:
         user = await self.bot.maybe_fetch_user(reminder["member"])
         embed = FullEmbed(
             title="**Reminder**",
             fields=[EmbedField(name="**original message:**", value=reminder["jumplink"])],
             description=f"""You asked to be reminded of: "{reminder["message"]}" """,
         )
-        await user.send(embed=embed)
+        if user:
+            await user.send(embed=embed)
         await self.bot.execute("DELETE FROM reminder WHERE jumplink=$1", reminder["jumplink"])
 
-    @ReminderTask.before_loop
-    async def BeforeReminder(self):
-        await self.bot.wait_until_ready()
-
 
 async def setup(bot):
     await bot.add_cog(Reminder(bot))
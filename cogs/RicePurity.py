@@ -7,7 +7,7 @@ from discord.ext import commands
 from discord.ui import Button, Item, button
 from WorstBot import WorstBot
 
-from modules.EmbedGen import EmbedField, EmbedFieldList
+from modules.EmbedGen import EmbedField, LazyEmbedFieldList
 from modules.Paginators import ButtonPaginatedEmbeds
 
 
@@ -97,21 +97,20 @@ class RicePurity(commands.GroupCog, name="ricepurity"):  # Main cog class
         :param interaction:
         :return:
         """
-        users = {}
-        for member in interaction.guild.members:
-            if (score := await self.bot.fetchval("SELECT score FROM ricepurity WHERE id=$1", member.id)) is not None:
-                users[member.id] = score
-        embed_list = EmbedFieldList(
+        await interaction.response.defer(ephemeral=True)
+        scores = await self.bot.fetch(
+            "SELECT id, score FROM ricepurity WHERE id = ANY($1::BIGINT[]) AND score IS NOT NULL ORDER BY score",
+            [member.id for member in interaction.guild.members],
+        )
+        embed_list = LazyEmbedFieldList(
+            scores,
+            lambda _, row: EmbedField(name=str(interaction.guild.get_member(row["id"])), value=str(row["score"])),
             title="Rice Purity Scores",
-            fields=[
-                EmbedField(name=str(await self.bot.maybe_fetch_user(userid)), value=str(user_score))
-                for userid, user_score in sorted(users.items(), key=lambda item: item[1])
-            ],
             max_fields=9,
             colour=discord.Colour.dark_purple(),
         )
         view = ButtonPaginatedEmbeds(timeout=30, embed_list=embed_list)
-        await interaction.response.send_message(view=view, embed=view.embedlist[0], ephemeral=True)
+        await interaction.followup.send(view=view, embed=view.embedlist[0], ephemeral=True)
         view.response = await interaction.original_response()
 
 
@@ -1,8 +1,8 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from WorstBot import WorstBot
-from datetime import datetime as dt, timezone, timedelta
-from asyncpg import Record
+from datetime import datetime as dt, timedelta
+from functools import partial
 
 
 class Events(commands.Cog):
@@ -15,13 +15,21 @@ class Events(commands.Cog):
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS scheduled_events(event BIGINT PRIMARY KEY, guild BIGINT, expiretime timestamptz)"
         )
-        self.Channel_Create.start()
+        for row in await self.bot.fetch("SELECT * FROM scheduled_events"):
+            self.schedule(row["event"], row["guild"], row["expiretime"])
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
-        self.Channel_Create.stop()
+        self.bot.scheduler.cancel_namespace("scheduled_events")
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
+    def schedule(self, event_id: int, guild_id: int, start_time: dt) -> None:
+        self.bot.scheduler.schedule(
+            ("scheduled_events", event_id),
+            start_time - timedelta(minutes=10),
+            partial(self.channel_create, event_id, guild_id),
+        )
+
     @commands.Cog.listener()
     async def on_scheduled_event_create(self, event: discord.ScheduledEvent):
         if await self.bot.events(event.guild.id, self.bot._events.autoevent) is False:
@@ -38,61 +46,52 @@ class Events(commands.Cog):
             event.guild_id,
             event.start_time,
         )
+        self.schedule(event.id, event.guild_id, event.start_time)
 
     @commands.Cog.listener()
     async def on_scheduled_event_delete(self, event: discord.ScheduledEvent):
+        self.bot.scheduler.cancel(("scheduled_events", event.id))
         await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event.id)
 
     @commands.Cog.listener()
     async def on_scheduled_event_update(self, before: discord.ScheduledEvent, after: discord.ScheduledEvent):
         if after.status is discord.EventStatus.active and after.start_time != discord.utils.utcnow():
+            self.bot.scheduler.cancel(("scheduled_events", after.id))
             return await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", after.id)
-        await self.bot.execute(
-            "UPDATE scheduled_events SET expiretime = $1 WHERE event = $2", after.start_time, before.id
+        guild_id = await self.bot.fetchval(
+            "UPDATE scheduled_events SET expiretime = $1 WHERE event = $2 RETURNING guild", after.start_time, before.id
         )
-
-    @tasks.loop(seconds=1)
-    async def Channel_Create(self):
-        events: list[Record] = await self.bot.fetch(
-            "SELECT * FROM scheduled_events WHERE expiretime = (SELECT MIN(expiretime) FROM scheduled_events)"
+        if guild_id:
+            self.schedule(after.id, guild_id, after.start_time)
+
+    async def channel_create(self, event_id: int, guild_id: int) -> None:
+        if await self.bot.events(guild_id, self.bot._events.autoevent) is False:
+            return await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event_id)
+
+        guild: discord.Guild = self.bot.get_guild(guild_id)
+        event: discord.ScheduledEvent = guild and await self.bot.maybe_fetch_event(guild, event_id)
+        if not event:
+            return await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event_id)
+        base_call_id = await self.bot.fetchval("SELECT channel FROM personalcall WHERE guild=$1", event.guild_id)
+        base_call: discord.VoiceChannel = await self.bot.maybe_fetch_channel(base_call_id)  # type: ignore
+        if not base_call:
+            return await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event.id)
+        category: discord.CategoryChannel = base_call.category
+
+        overwrites = {member: discord.PermissionOverwrite(view_channel=True) for member in guild.members} | {
+            guild.self_role: discord.PermissionOverwrite(view_channel=True),
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+        }
+        channel = await category.create_voice_channel(
+            name=event.name,
+            user_limit=99,
+            bitrate=event.guild.bitrate_limit,
+            overwrites=overwrites,
         )
-        if not events:
-            return
 
-        for row in events:  # type: Record
-            if await self.bot.events(row["guild"], self.bot._events.autoevent) is False:
-                continue
-            if (row["expiretime"] - dt.now(timezone.utc)).days > 7:
-                continue
-
-            await discord.utils.sleep_until((row["expiretime"] - timedelta(minutes=10)))
-
-            guild: discord.Guild = self.bot.get_guild(row["guild"])
-            event: discord.ScheduledEvent = await self.bot.maybe_fetch_event(guild, row["event"])
-            base_call_id = await self.bot.fetchval("SELECT channel FROM personalcall WHERE guild=$1", event.guild_id)
-            base_call: discord.VoiceChannel = await self.bot.maybe_fetch_channel(base_call_id)  # type: ignore
-            if not base_call:
-                return await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event.id)
-            category: discord.CategoryChannel = base_call.category
-
-            overwrites = {member: discord.PermissionOverwrite(view_channel=True) for member in guild.members} | {
-                guild.self_role: discord.PermissionOverwrite(view_channel=True),
-                guild.default_role: discord.PermissionOverwrite(view_channel=False),
-            }
-            channel = await category.create_voice_channel(
-                name=event.name,
-                user_limit=99,
-                bitrate=event.guild.bitrate_limit,
-                overwrites=overwrites,
-            )
-
-            await event.edit(channel=channel, reason="WorstBot AutoEvent Startup")
-
-            await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event.id)
-
-    @Channel_Create.before_loop
-    async def BeforeReminder(self):
-        await self.bot.wait_until_ready()
+        await event.edit(channel=channel, reason="WorstBot AutoEvent Startup")
+
+        await self.bot.execute("DELETE FROM scheduled_events WHERE event = $1", event.id)
 
 
 async def setup(bot):
@@ -43,6 +43,9 @@ class Stats(commands.GroupCog, name="stats"):
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS usage(command TEXT, guild BIGINT, execution_time timestamptz)"
         )
+        self.bot.register_statement(
+            "stats.usage", "INSERT INTO usage(command, guild, execution_time) VALUES($1, $2, $3)"
+        )
         self.file_finder.start()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
@@ -189,8 +192,8 @@ class Stats(commands.GroupCog, name="stats"):
     ) -> None:
         if await self.bot.events(interaction.guild_id, self.bot._events.usage) is False:
             return
-        await self.bot.execute(
-            "INSERT INTO usage(command, guild, execution_time) VALUES($1, $2, $3)",
+        await self.bot.execute_prepared(
+            "stats.usage",
             command.qualified_name,
             interaction.guild_id,
             interaction.created_at,
@@ -1,8 +1,20 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 from WorstBot import WorstBot
 
+REPOST_DELAY = 2  # seconds a burst of messages is collected before the sticky is re-sent
+
+
+@dataclass(slots=True)
+class Sticky:
+    message: str
+    messageid: Optional[int] = None
+
 
 @app_commands.default_permissions()
 @app_commands.guild_only()
@@ -10,14 +22,24 @@ class StickyMessage(commands.GroupCog, name="sticky"):
     def __init__(self, bot: WorstBot):
         self.bot = bot
         self.logger = self.bot.logger.getChild(self.qualified_name)
+        self.stickies: dict[int, Sticky] = {}
+        self.reposts: dict[int, asyncio.Task] = {}
+        self.dirty: set[int] = set()  # channels with messages newer than their last sticky
 
     async def cog_load(self) -> None:
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS sticky(channel BIGINT UNIQUE NOT NULL,messageid BIGINT, message TEXT NOT NULL )"
         )
+        self.bot.register_statement("sticky.set_message", "UPDATE sticky SET messageid=$1 WHERE channel=$2")
+        self.stickies = {
+            row["channel"]: Sticky(row["message"], row["messageid"])
+            for row in await self.bot.fetch("SELECT * FROM sticky")
+        }
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
+        for task in self.reposts.values():
+            task.cancel()
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
     @app_commands.command(name="add", description="Pin a message to the bottom of a channel")
@@ -28,26 +50,46 @@ class StickyMessage(commands.GroupCog, name="sticky"):
             None,
             message,
         )
+        self.stickies[interaction.channel_id] = Sticky(message)
         await interaction.response.send_message(f'"{message}" \n\nhas been added as a sticky.')
 
     @app_commands.command(name="remove", description="Remove pinned message")
     async def StickyRemove(self, interaction: discord.Interaction):
         await self.bot.execute("DELETE FROM sticky WHERE channel=$1", interaction.channel_id)
+        self.stickies.pop(interaction.channel_id, None)
         await interaction.response.send_message("Sticky has been removed from this channel.", ephemeral=True)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        sticky = await self.bot.fetchrow("SELECT * FROM sticky WHERE channel=$1", message.channel.id)
-        if message.author.bot or not sticky:
+        if message.author.bot or message.channel.id not in self.stickies:
+            return
+        self.dirty.add(message.channel.id)
+        if message.channel.id in self.reposts:  # the running repost picks this message up
             return
-        if sticky["messageid"]:
-            try:
-                oldmessage = message.channel.get_partial_message(sticky["messageid"])
-            except:
-                oldmessage = message.channel.get_partial_message(message.channel.last_message_id)
-            await oldmessage.delete()
-        sticky = await message.channel.send(sticky["message"])
-        await self.bot.execute("UPDATE sticky SET messageid=$1 WHERE channel=$2", sticky.id, message.channel.id)
+        self.reposts[message.channel.id] = self.bot.loop.create_task(self.repost(message.channel))
+
+    async def repost(self, channel: discord.abc.Messageable) -> None:
+        """Re-sends the sticky once per burst, going again if messages arrived while it was being sent"""
+        try:
+            while channel.id in self.dirty:
+                await asyncio.sleep(REPOST_DELAY)
+                self.dirty.discard(channel.id)
+                sticky = self.stickies.get(channel.id)
+                if not sticky:
+                    return
+                if sticky.messageid:
+                    try:
+                        await channel.get_partial_message(sticky.messageid).delete()
+                    except discord.HTTPException:
+                        pass
+                new_message = await channel.send(sticky.message)
+                sticky.messageid = new_message.id
+                await self.bot.execute_prepared("sticky.set_message", new_message.id, channel.id)
+        except Exception as e:
+            self.logger.exception(f"Failed to repost sticky in {channel.id}", exc_info=e)
+        finally:
+            self.reposts.pop(channel.id, None)
+            self.dirty.discard(channel.id)
 
 
 async def setup(bot):
@@ -2,8 +2,14 @@ import discord
 from discord import Interaction, app_commands
 from discord.ext import commands, tasks
 from WorstBot import WorstBot
-from asyncio import sleep
-from modules import Converters, EmbedGen
+from asyncio import gather, sleep
+from typing import Optional
+from asyncpg import Record
+from modules import Cache, Converters, EmbedGen
+from modules.Helix import HelixClient, chunked
+
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 5 * 60
 
 
 @app_commands.default_permissions()
@@ -13,16 +19,28 @@ class Twitch(commands.GroupCog, name="twitch"):
         self.bot = bot
         self.TwitchClientId = self.bot.dotenv.get("twitch_client")
         self.TwitchSecret = self.bot.dotenv.get("twitch_secret")
-        self.token = None
-        self.streamersTable = None
+        self.streamersTable: list[Record] = []
+        self.tracked: dict[int, list[Record]] = {}
+        self.live: set[int] = set()
+        self.display_names: dict[int, str] = {}
+        self.search_cache: Cache.LRUCache[str, list[app_commands.Choice]] = Cache.LRUCache(
+            SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+        )
         self.logger = self.bot.logger.getChild(self.qualified_name)
+        self.helix: Optional[HelixClient] = None
 
     async def cog_load(self) -> None:
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS twitch(guild BIGINT NOT NULL, channel BIGINT NOT NULL, userid BIGINT NOT NULL, role BIGINT, live BOOLEAN NOT NULL DEFAULT FALSE, UNIQUE(guild, userid))"
         )
-        await self.TokenGen()
+        self.bot.register_statement(
+            "twitch.set_live",
+            "UPDATE twitch SET live = data.live FROM UNNEST($1::BIGINT[], $2::BOOLEAN[]) AS data(userid, live) WHERE twitch.userid = data.userid",
+        )
+        self.helix = HelixClient(self.bot.session, self.TwitchClientId, self.TwitchSecret, self.logger)
+        await self.helix.renew_token()
         await self.streamers()
+        self.live = {row["userid"] for row in self.streamersTable if row["live"]}
         self.request.start()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
@@ -32,25 +50,9 @@ class Twitch(commands.GroupCog, name="twitch"):
 
     async def streamers(self):
         self.streamersTable = await self.bot.fetch("SELECT * FROM twitch")
-
-    async def validate(self, token: int):
-        validity = await self.bot.get(
-            url="https://id.twitch.tv/oauth2/validate", headers={"Authorization": f"Bearer {token}"}
-        )
-        if validity["status"] == 200:
-            return True
-        await self.TokenGen()
-
-    async def TokenGen(self):
-        token = await self.bot.post(
-            url="https://id.twitch.tv/oauth2/token",
-            params={
-                "client_id": self.TwitchClientId,
-                "client_secret": self.TwitchSecret,
-                "grant_type": "client_credentials",
-            },
-        )
-        self.token = token.get("access_token")
+        self.tracked = {}
+        for row in self.streamersTable:
+            self.tracked.setdefault(row["userid"], []).append(row)
 
     @app_commands.command(name="add", description="Get live alerts for your selected twitch channel")
     async def LiveTrackingAdd(
@@ -82,76 +84,97 @@ class Twitch(commands.GroupCog, name="twitch"):
 
     @LiveTrackingAdd.autocomplete("twitch_user")
     async def LiveTrackingAddAutocomplete(self, interaction: Interaction, current):
-        if not await self.validate(self.token):
-            return []
         if len(current) < 3:
             return []
-        responses = await self.bot.get(
-            url="https://api.twitch.tv/helix/search/channels",
-            params={"query": current, "first": 25},
-            headers={"client-id": self.TwitchClientId, "Authorization": "Bearer " + self.token},
-        )
-        return [
+        query = current.lower()
+        if (choices := self.search_cache.get(query)) is not None:
+            return choices
+        responses = await self.helix.get("search/channels", [("query", current), ("first", 25)], retries=1)
+        if not responses:
+            return []
+        choices = [
             app_commands.Choice(name=response["display_name"], value=response["id"]) for response in responses["data"]
         ]
+        self.search_cache[query] = choices
+        return choices
 
     @LiveTrackingRemove.autocomplete("twitch_user")
     async def LiveTrackingRemoveAutocomplete(self, interaction: Interaction, current):
-        if not await self.validate(self.token):
-            return []
-        streamIDs = await self.bot.fetch("SELECT userid FROM twitch WHERE guild=$1 LIMIT 25", interaction.guild_id)
-        if not streamIDs:
-            return []
-        streamers = await self.bot.get(
-            url="https://api.twitch.tv/helix/channels",
-            params={"broadcaster_id": [streamID["userid"] for streamID in streamIDs]},
-            headers={"client-id": self.TwitchClientId, "Authorization": "Bearer " + self.token},
-        )
-        return [
-            app_commands.Choice(name=streamer["broadcaster_name"], value=streamer["broadcaster_id"])
-            for streamer in streamers["data"]
-        ]
+        current = current.lower()
+        choices = []
+        for row in self.streamersTable:
+            if row["guild"] != interaction.guild_id:
+                continue
+            name = self.display_names.get(row["userid"], str(row["userid"]))
+            if current in name.lower():
+                choices.append(app_commands.Choice(name=name, value=str(row["userid"])))
+        return choices[:25]
 
     @tasks.loop(minutes=1, reconnect=True)
     async def request(self):
-        if not await self.validate(self.token):
+        if not self.tracked:
+            return
+        user_ids = list(self.tracked)
+        chunks = chunked(user_ids)
+        results = await gather(*(self.helix.fetch_streams(chunk) for chunk in chunks))
+        await self.fetch_display_names([user_id for user_id in user_ids if user_id not in self.display_names])
+
+        live_streams: dict[int, dict] = {}
+        unknown: set[int] = set()
+        for chunk, streams in zip(chunks, results):
+            if streams is None:  # a failed chunk must not look like its streamers going offline
+                unknown.update(chunk)
+                continue
+            live_streams |= {int(stream["user_id"]): stream for stream in streams}
+        for user_id, stream in live_streams.items():
+            self.display_names[user_id] = stream["user_name"]
+
+        live_now = (live_streams.keys() & self.tracked.keys()) | (self.live & unknown)
+        went_live = live_now - self.live
+        went_offline = self.live - live_now
+        self.live = set(live_now)
+        if not went_live and not went_offline:
             return
-        streams = await self.bot.get(
-            url="https://api.twitch.tv/helix/streams",
-            params={"user_id": [user["userid"] for user in self.streamersTable]},
-            headers={"client-id": self.TwitchClientId, "Authorization": "Bearer " + self.token},
+
+        changed = [*went_live, *went_offline]
+        await self.bot.execute_prepared(
+            "twitch.set_live",
+            changed,
+            [userid in went_live for userid in changed],
         )
 
-        for user in self.streamersTable:
-            if await self.bot.events(user["guild"], self.bot._events.twitch) is False:
-                return
-            if not any(int(stream["user_id"]) == user["userid"] for stream in streams["data"]):
-                await self.bot.execute("UPDATE twitch SET live = FALSE WHERE userid = $1", user["userid"])
-                continue
-            if await self.bot.fetchval("SELECT live FROM twitch WHERE userid=$1", user["userid"]) is True:
-                continue
+        announcements = [
+            self.announce(row, live_streams[userid]) for userid in went_live for row in self.tracked.get(userid, [])
+        ]
+        for result in await gather(*announcements, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.logger.exception("Failed to send live alert", exc_info=result)
+
+    async def fetch_display_names(self, user_ids: list[int]) -> None:
+        """Caches display names for streamers the polling loop has not seen yet"""
+        for user in await self.helix.fetch_users(user_ids):
+            self.display_names[int(user["id"])] = user["display_name"]
+
+    async def announce(self, row: Record, stream: dict) -> None:
+        if await self.bot.events(row["guild"], self.bot._events.twitch) is False:
+            return
+        channel: discord.PartialMessageable = self.bot.get_partial_messageable(row["channel"], guild_id=row["guild"])
 
-            await self.bot.execute("UPDATE twitch SET live = TRUE WHERE userid=$1", user["userid"])
-            stream = [dictionary for dictionary in streams["data"] if int(dictionary["user_id"]) == user["userid"]][0]
-            guild: discord.Guild = await self.bot.maybe_fetch_guild(user["guild"])
-            channel: discord.PartialMessageable = self.bot.get_partial_messageable(user["channel"])
-
-            if user["role"] == 0:
-                role_mention = "@everyone"
-            elif user["role"] is None:
-                role_mention = None
-            else:
-                role = guild.get_role(user["role"])
-                role_mention = role.mention
-
-            embed = EmbedGen.SimpleEmbed(
-                author={"name": stream["user_name"], "url": f"https://www.twitch.tv/{stream['user_name']}"},
-                title=stream["user_name"],
-                text=f"{stream['user_name']} just went live on twitch!\n{stream['title']}\nfind them at https://www.twitch.tv/{stream['user_name']}",
-                footer={"text": stream["started_at"].split("T")[1].split("Z")[0]},
-                image=stream["thumbnail_url"].replace("-{width}x{height}", ""),
-            )
-            await channel.send(embed=embed, content=role_mention)
+        if row["role"] == 0:
+            role_mention = "@everyone"
+        elif row["role"] is None:
+            role_mention = None
+        else:
+            role_mention = f"<@&{row['role']}>"
+
+        embed = EmbedGen.SimpleEmbed(
+            author={"name": stream["user_name"], "url": f"https://www.twitch.tv/{stream['user_name']}"},
+            title=stream["user_name"],
+            text=f"{stream['user_name']} just went live on twitch!\n{stream['title']}\nfind them at https://www.twitch.tv/{stream['user_name']}",
+            footer={"text": stream["started_at"].split("T")[1].split("Z")[0]},
+            image=stream["thumbnail_url"].replace("-{width}x{height}", ""),
+        )
+        await channel.send(embed=embed, content=role_mention)
 
     @request.before_loop
     async def before_my_task(self):
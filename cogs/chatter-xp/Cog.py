@@ -1,28 +1,48 @@
 from __future__ import annotations
 
-from asyncio import sleep
+from asyncio import Lock, Task, shield
+from dataclasses import dataclass
 from datetime import timedelta
 from math import sqrt
-from typing import TYPE_CHECKING
+from time import perf_counter
+from typing import TYPE_CHECKING, Optional
 
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.utils import utcnow
 
-from modules import EmbedGen, Paginators
+from modules import Cache, EmbedGen, Paginators
 
 if TYPE_CHECKING:
     from datetime import datetime
 
-    from discord import Guild, Interaction, Member, User
+    from discord import Guild, Interaction, Member
 
     from WorstBot import WorstBot
 
 
+FLUSH_INTERVAL = 30  # seconds between write-behind flushes
+FLUSH_THRESHOLD = 500  # pending chatters that trigger an early flush
+LEADERBOARD_SIZE = 1000
+CACHE_SIZE = 10_000
+CACHE_TTL = 60 * 60  # seconds before a cached chatter is re-read from the database
+
+
+@dataclass(slots=True)
+class FlushStats:
+    flushes: int = 0
+    rows: int = 0
+    last_size: int = 0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+
+
 class Chatter:
-    def __init__(self, user: User | Member, xp: int, last_message: datetime):
-        self.user: User | Member = user
+    __slots__ = ("user_id", "_xp", "_level", "last_message")
+
+    def __init__(self, user_id: int, xp: int, last_message: datetime):
+        self.user_id: int = user_id
         self._xp: int = xp
         self._level: int = 0
         self.update_level()
@@ -48,15 +68,15 @@ class Chatter:
         return self.update_level()
 
     def __repr__(self) -> str:
-        return f"<Chatter user={self.user} xp={self.xp} level={self.level} last_message={self.last_message}>"
+        return f"<Chatter user_id={self.user_id} xp={self.xp} level={self.level} last_message={self.last_message}>"
 
     def __hash__(self) -> int:
-        return hash(self.user)
+        return hash(self.user_id)
 
     def __eq__(self, o: object) -> bool:
         if not isinstance(o, Chatter):
             return False
-        return self.user == o.user
+        return self.user_id == o.user_id
 
 
 @app_commands.guild_only()
@@ -65,46 +85,107 @@ class ChatterXP(commands.GroupCog, name="chatter-xp"):
     def __init__(self, bot: WorstBot):
         self.bot = bot
         self.logger = self.bot.logger.getChild(self.qualified_name)
-        self.chatters: dict[User | Member, Chatter] = {}
+        self.chatters: Cache.LRUCache[int, Chatter] = Cache.LRUCache(CACHE_SIZE, CACHE_TTL)
+        self.dirty: dict[int, Chatter] = {}
+        self.flush_lock = Lock()
+        self.flush_stats = FlushStats()
+        self.early_flush: Optional[Task] = None
 
     async def cog_load(self) -> None:
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS chatter_xp(user_id BIGINT PRIMARY KEY, xp INT DEFAULT 0, last_message TIMESTAMPTZ DEFAULT NOW())"
         )
+        self.bot.register_statement("chatter_xp.get", "SELECT * FROM chatter_xp WHERE user_id = $1")
+        self.bot.register_statement(
+            "chatter_xp.flush",
+            """
+            INSERT INTO chatter_xp(user_id, xp, last_message)
+            SELECT * FROM UNNEST($1::BIGINT[], $2::INT[], $3::TIMESTAMPTZ[])
+            ON CONFLICT (user_id) DO UPDATE SET xp = excluded.xp, last_message = excluded.last_message
+            """,
+        )
+        self.flush_task.start()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
+        self.flush_task.cancel()
+        await self.flush()
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
-    async def prepare_guild(self, guild: Guild) -> list[Chatter]:
-        self.logger.debug(f"Preparing guild {guild}")
-        chatters = []
-        for member in guild.members:
-            if member.bot:
-                continue
-            chatter = await self.get_chatter(member)
-            if chatter.xp > 1:
-                chatters.append(chatter)
-            await sleep(0)
-        return chatters
-
-    async def get_chatter(self, key: User | Member):
-        if key in self.chatters:
-            self.logger.debug(f"Found {key} in cache")
-            return self.chatters[key]
-
-        row = await self.bot.fetchrow("SELECT * FROM chatter_xp WHERE user_id = $1", key.id)
-        if row:
-            chatter = Chatter(key, row["xp"], row["last_message"])
-            self.chatters[key] = chatter
-            self.logger.debug(f"Found {key} in database")
+    def mark_dirty(self, chatter: Chatter) -> None:
+        self.dirty[chatter.user_id] = chatter
+        if len(self.dirty) >= FLUSH_THRESHOLD and not self.flush_lock.locked():
+            if self.early_flush is None or self.early_flush.done():
+                self.early_flush = self.bot.loop.create_task(self.safe_flush())
+
+    async def flush(self) -> None:
+        """Writes all pending xp changes to the database in a single upsert"""
+        async with self.flush_lock:
+            if not self.dirty:
+                return
+            pending, self.dirty = self.dirty, {}
+            chatters = list(pending.values())
+            start = perf_counter()
+            try:
+                await self.bot.execute_prepared(
+                    "chatter_xp.flush",
+                    [chatter.user_id for chatter in chatters],
+                    [chatter.xp for chatter in chatters],
+                    [chatter.last_message for chatter in chatters],
+                )
+            except BaseException:  # includes cancellation, so unload can't drop xp
+                for user_id, chatter in pending.items():  # newer changes made during the flush take priority
+                    self.dirty.setdefault(user_id, chatter)
+                raise
+            latency = perf_counter() - start
+
+        stats = self.flush_stats
+        stats.flushes += 1
+        stats.rows += len(chatters)
+        stats.last_size = len(chatters)
+        stats.last_latency = latency
+        stats.max_latency = max(stats.max_latency, latency)
+        self.logger.debug(f"Flushed {len(chatters)} chatters in {latency * 1000:.2f}ms")
+
+    async def safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            self.logger.exception("Failed to flush chatter xp", exc_info=e)
+
+    @tasks.loop(seconds=FLUSH_INTERVAL)
+    async def flush_task(self):
+        await shield(self.safe_flush())  # cancelling the loop on unload can't abort a write in progress
+        self.logger.debug(f"Chatter cache {len(self.chatters)}/{self.chatters.maxsize}: {self.chatters.stats}")
+
+    async def fetch_leaderboard(self, guild: Guild) -> list[tuple[Member, Chatter]]:
+        """Returns the guild's top chatters in xp order using a single query"""
+        self.logger.debug(f"Fetching leaderboard for {guild}")
+        await self.flush()
+        members = {member.id: member for member in guild.members if not member.bot}
+        rows = await self.bot.fetch(
+            "SELECT user_id, xp, last_message FROM chatter_xp WHERE user_id = ANY($1::BIGINT[]) AND xp > 1 ORDER BY xp DESC LIMIT $2",
+            list(members),
+            LEADERBOARD_SIZE,
+        )
+        return [(members[row["user_id"]], Chatter(row["user_id"], row["xp"], row["last_message"])) for row in rows]
+
+    async def get_chatter(self, user_id: int) -> Chatter:
+        chatter = self.chatters.get(user_id) or self.dirty.get(user_id)  # unflushed chatters outlive eviction
+        if chatter:
+            self.logger.debug(f"Found {user_id} in cache")
+            self.chatters[user_id] = chatter
             return chatter
+
+        row = await self.bot.fetchrow_prepared("chatter_xp.get", user_id)
+        if row:
+            chatter = Chatter(user_id, row["xp"], row["last_message"])
+            self.logger.debug(f"Found {user_id} in database")
         else:
-            chatter = Chatter(key, 0, utcnow())
-            self.chatters[key] = chatter
-            await self.bot.execute("INSERT INTO chatter_xp(user_id) VALUES($1)", key.id)
-            self.logger.debug(f"Created {key} in database")
-            return chatter
+            chatter = Chatter(user_id, 0, utcnow())
+            self.logger.debug(f"Created {user_id} in cache")
+        self.chatters[user_id] = chatter
+        return chatter
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -118,7 +199,7 @@ class ChatterXP(commands.GroupCog, name="chatter-xp"):
             self.logger.debug(f"Message from {message.author} bot ignored")
             return
 
-        chatter = await self.get_chatter(message.author)
+        chatter = await self.get_chatter(message.author.id)
         if chatter.last_message + timedelta(minutes=1) > utcnow():
             self.logger.debug(
                 f"Message from {message.author} too soon, time remaining: {chatter.last_message + timedelta(minutes = 1) - utcnow()}"
@@ -127,12 +208,7 @@ class ChatterXP(commands.GroupCog, name="chatter-xp"):
 
         chatter.last_message = utcnow()
         level_up = chatter.add_xp(1)
-        await self.bot.execute(
-            "UPDATE chatter_xp SET xp = $1, last_message = $2 WHERE user_id = $3",
-            chatter.xp,
-            chatter.last_message,
-            chatter.user.id,
-        )
+        self.mark_dirty(chatter)
 
         if level_up:
             await message.channel.send(
@@ -155,7 +231,7 @@ class ChatterXP(commands.GroupCog, name="chatter-xp"):
         :return:
         """
         await interaction.response.defer(ephemeral=True)
-        chatter = await self.get_chatter(interaction.user)
+        chatter = await self.get_chatter(interaction.user.id)
         next_level = int((5 * (chatter.level + 1) * (chatter.level + 2)) / 2)
         await interaction.followup.send(
             embed=EmbedGen.FullEmbed(
@@ -178,25 +254,16 @@ class ChatterXP(commands.GroupCog, name="chatter-xp"):
         """
         await interaction.response.defer(ephemeral=True)
         assert interaction.guild
-        chatters = await self.prepare_guild(interaction.guild)
-        chatters.sort(key=lambda chatter: chatter.xp, reverse=True)
-
-        fields = []
-        for i, chatter in enumerate(chatters):
-            member = interaction.guild.get_member(chatter.user.id)
-            if not member:
-                continue
-            fields.append(
-                EmbedGen.EmbedField(
-                    name=f"{i + 1}: {member.display_name}",
-                    value=f"Level {chatter.level} ({chatter.xp} xp)",
-                    inline=False,
-                )
-            )
-
-        embed_list = EmbedGen.EmbedFieldList(
+        chatters = await self.fetch_leaderboard(interaction.guild)
+
+        embed_list = EmbedGen.LazyEmbedFieldList(
+            chatters,
+            lambda i, entry: EmbedGen.EmbedField(
+                name=f"{i + 1}: {entry[0].display_name}",
+                value=f"Level {entry[1].level} ({entry[1].xp} xp)",
+                inline=False,
+            ),
             title="Leaderboard",
-            fields=fields,
             max_fields=10,
         )
         view = Paginators.ButtonPaginatedEmbeds(embed_list)
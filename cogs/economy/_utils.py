@@ -1,17 +1,76 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Self
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Optional, Self, TypeVar
+from asyncio import Lock, Task
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from weakref import WeakValueDictionary
 import logging
 
 from discord import Member, Guild
+from discord.utils import utcnow
 
 if TYPE_CHECKING:
     from WorstBot import WorstBot
 
 _log = logging.getLogger("economy._utils")
+T = TypeVar("T")
+_wallet_locks: WeakValueDictionary[tuple[int, int], Lock] = WeakValueDictionary()
+_guild_locks: WeakValueDictionary[int, Lock] = WeakValueDictionary()
+_live_wallets: WeakValueDictionary[int, Wealth] = WeakValueDictionary()
 
+ECONOMY_CACHE_GUILDS = 100  # guilds whose wallets stay cached, least recently used are evicted first
+LOAD_PREFETCH = 500  # rows fetched per round-trip when loading a guild's wallets
+LEDGER_FLUSH_INTERVAL = 10  # seconds between ledger flushes
+LEDGER_FLUSH_THRESHOLD = 200  # pending wallets or transactions that trigger an early flush
 
-@dataclass
+FLUSH_WALLETS = """
+INSERT INTO economy(user_id, guild_id, wallet, bank, tokens, multiplier)
+SELECT * FROM UNNEST($1::BIGINT[], $2::BIGINT[], $3::FLOAT[], $4::FLOAT[], $5::FLOAT[], $6::FLOAT[])
+ON CONFLICT (user_id, guild_id) DO UPDATE SET
+wallet=excluded.wallet, bank=excluded.bank, tokens=excluded.tokens, multiplier=excluded.multiplier
+"""
+TRANSFER = """
+WITH debit AS (
+    UPDATE economy SET wallet = wallet - $3
+    WHERE user_id = $1 AND guild_id = $4 AND wallet >= $3
+    RETURNING user_id, wallet
+), credit AS (
+    UPDATE economy SET wallet = wallet + $3
+    WHERE user_id = $2 AND guild_id = $4 AND EXISTS (SELECT 1 FROM debit)
+    RETURNING user_id, wallet
+)
+SELECT * FROM debit UNION ALL SELECT * FROM credit
+"""
+FLUSH_TRANSACTIONS = """
+INSERT INTO transactions(user_id, recipient, recipient_id, amount, timestamp)
+SELECT * FROM UNNEST($1::BIGINT[], $2::recipient_type[], $3::BIGINT[], $4::FLOAT[], $5::TIMESTAMPTZ[])
+"""
+RECORD_TRANSFER = """
+INSERT INTO transactions(user_id, recipient, recipient_id, amount, timestamp)
+VALUES($1, 'transfer', $2, $3, now()::timestamptz)
+"""
+LOAD_WALLETS = "SELECT user_id, guild_id, wallet, bank, tokens, multiplier FROM economy WHERE guild_id = $1"
+STATEMENTS = {
+    "economy.flush_wallets": FLUSH_WALLETS,
+    "economy.flush_transactions": FLUSH_TRANSACTIONS,
+    "economy.transfer": TRANSFER,
+    "economy.record_transfer": RECORD_TRANSFER,
+    "economy.load_wallets": LOAD_WALLETS,
+}
+
+
+@dataclass(slots=True)
+class Transaction:
+    user_id: int
+    recipient: str
+    amount: float
+    recipient_id: int = 0
+    guild_id: int = 0  # not stored, lets the ledger match a row to the wallet it explains
+    timestamp: datetime = field(default_factory=utcnow)
+
+
+@dataclass(slots=True, weakref_slot=True)
 class Wealth:
     member_id: int
     guild_id: int
@@ -26,89 +85,250 @@ class Wealth:
     def __eq__(self, other) -> bool:
         return self.member_id == other.member_id and self.guild_id == other.guild_id
 
-    async def sync(self, bot: WorstBot) -> None:
-        _log.debug(
-            f"Syncing {self.member_id} {self.guild_id} {self.wallet} {self.bank} {self.tokens} {self.multiplier}"
-        )
-        await bot.execute(
-            "INSERT INTO economy(user_id, guild_id, wallet, bank, tokens, multiplier) VALUES ($1, $2, $3, $4, $5, $6) ON CONFLICT (user_id, guild_id) DO UPDATE SET wallet=excluded.wallet, bank=excluded.bank, tokens=excluded.tokens, multiplier=excluded.multiplier",
-            self.member_id,
-            self.guild_id,
-            self.wallet,
-            self.bank,
-            self.tokens,
-            self.multiplier,
-        )
-
-    async def to_bank(self, bot: WorstBot, amount: float) -> Self:
-        self.wallet -= amount
-        self.bank += amount
-        await self.sync(bot)
-        return self
+    @property
+    def lock(self) -> Lock:
+        return wallet_lock(self.guild_id, self.member_id)
 
-    async def to_wallet(self, bot: WorstBot, amount: float) -> Self:
-        self.wallet += amount
-        self.bank -= amount
-        await self.sync(bot)
-        return self
+    async def to_bank(self, bot: WorstBot, amount: float) -> float:
+        async with self.lock:
+            amount = min(amount, self.wallet)
+            self.wallet -= amount
+            self.bank += amount
+            bot.ledger.record(self, transaction=Transaction(self.member_id, "deposit", amount, guild_id=self.guild_id))
+        return amount
 
-    async def to_tokens(self, bot: WorstBot, amount: float, conversion_rate: float) -> Self:
-        self.wallet -= amount
-        self.tokens += amount * conversion_rate
-        await self.sync(bot)
-        return self
+    async def to_wallet(self, bot: WorstBot, amount: float) -> float:
+        async with self.lock:
+            amount = min(amount, self.bank)
+            self.wallet += amount
+            self.bank -= amount
+            bot.ledger.record(self, transaction=Transaction(self.member_id, "withdraw", amount, guild_id=self.guild_id))
+        return amount
+
+    async def to_tokens(self, bot: WorstBot, amount: float, conversion_rate: float) -> float:
+        async with self.lock:
+            amount = min(amount, self.wallet)
+            self.wallet -= amount
+            self.tokens += amount * conversion_rate
+            transaction = Transaction(self.member_id, "ascend", amount * conversion_rate, guild_id=self.guild_id)
+            bot.ledger.record(self, transaction=transaction)
+        return amount
 
-    async def to_user(self, bot: WorstBot, amount: float, user: Wealth) -> (Self, Wealth):
-        self.wallet -= amount
-        user.wallet += amount
+    async def to_user(self, bot: WorstBot, amount: float, user: Wealth) -> float:
+        """Moves up to amount from this wallet to user's in one statement, returning the amount moved"""
+        if user == self:
+            return 0.0
 
-        await self.sync(bot)
-        await user.sync(bot)
+        async with lock_wallets(self, user):
+            amount = min(amount, self.wallet)
+            pending, transactions = await bot.ledger.detach(self, user)
+            try:
+                async with bot.transaction() as conn:
+                    if pending:
+                        flush_wallets = await bot.prepared(conn, "economy.flush_wallets")
+                        await flush_wallets.fetchval(*wallet_columns(pending))
+                    if transactions:
+                        flush_transactions = await bot.prepared(conn, "economy.flush_transactions")
+                        await flush_transactions.fetchval(*transaction_columns(transactions))
+                    transfer = await bot.prepared(conn, "economy.transfer")
+                    rows = await transfer.fetch(self.member_id, user.member_id, amount, self.guild_id)
+                    if rows:
+                        record_transfer = await bot.prepared(conn, "economy.record_transfer")
+                        await record_transfer.fetchval(self.member_id, user.member_id, amount)
+            except BaseException:
+                bot.ledger.record(*pending)
+                bot.ledger.transactions[:0] = transactions
+                raise
 
-        return self, user
+            balances = {row["user_id"]: row["wallet"] for row in rows}
+            self.wallet = balances.get(self.member_id, self.wallet)
+            user.wallet = balances.get(user.member_id, user.wallet)
+        return amount if rows else 0.0
 
-    async def reward(self, bot: WorstBot, amount: float, *, use_multiplier: bool = False) -> Self:
-        if use_multiplier:
-            amount *= self.multiplier
-        self.wallet += amount
-        await self.sync(bot)
+    async def reward(
+        self, bot: WorstBot, amount: float, *, use_multiplier: bool = False, transaction: Optional[str] = None
+    ) -> Self:
+        """transaction names the recipient_type of a transaction row to record together with the change"""
+        async with self.lock:
+            if use_multiplier:
+                amount *= self.multiplier
+            self.wallet += amount
+            row = Transaction(self.member_id, transaction, amount, guild_id=self.guild_id) if transaction else None
+            bot.ledger.record(self, transaction=row)
         return self
 
-    async def punish(self, bot: WorstBot, amount: float, *, use_multiplier: bool = False) -> Self:
-        if use_multiplier:
-            amount *= self.multiplier
-        self.wallet -= amount
-        await self.sync(bot)
+    async def punish(
+        self, bot: WorstBot, amount: float, *, use_multiplier: bool = False, transaction: Optional[str] = None
+    ) -> Self:
+        """transaction names the recipient_type of a transaction row to record together with the change"""
+        async with self.lock:
+            if use_multiplier:
+                amount *= self.multiplier
+            self.wallet -= amount
+            row = Transaction(self.member_id, transaction, amount, guild_id=self.guild_id) if transaction else None
+            bot.ledger.record(self, transaction=row)
         return self
 
 
+def wallet_lock(guild_id: int, member_id: int) -> Lock:
+    """Returns the lock guarding a wallet, kept only while something holds or waits on it"""
+    key = (guild_id, member_id)
+    lock = _wallet_locks.get(key)
+    if lock is None:
+        lock = _wallet_locks[key] = Lock()
+    return lock
+
+
+def guild_lock(guild_id: int) -> Lock:
+    lock = _guild_locks.get(guild_id)
+    if lock is None:
+        lock = _guild_locks[guild_id] = Lock()
+    return lock
+
+
+@asynccontextmanager
+async def lock_wallets(*wallets: Wealth) -> AsyncIterator[None]:
+    """Holds several wallet locks, always taken in the same order so overlapping transfers can't deadlock"""
+    async with AsyncExitStack() as stack:
+        for guild_id, member_id in sorted({(wealth.guild_id, wealth.member_id) for wealth in wallets}):
+            await stack.enter_async_context(wallet_lock(guild_id, member_id))
+        yield
+
+
+def transaction_columns(transactions: list[Transaction]) -> tuple[list, ...]:
+    return (
+        [transaction.user_id for transaction in transactions],
+        [transaction.recipient for transaction in transactions],
+        [transaction.recipient_id for transaction in transactions],
+        [transaction.amount for transaction in transactions],
+        [transaction.timestamp for transaction in transactions],
+    )
+
+
+def partition(items: list[T], predicate: Callable[[T], bool]) -> tuple[list[T], list[T]]:
+    matched, rest = [], []
+    for item in items:
+        (matched if predicate(item) else rest).append(item)
+    return matched, rest
+
+
+def wallet_columns(wallets: list[Wealth]) -> tuple[list, ...]:
+    return (
+        [wealth.member_id for wealth in wallets],
+        [wealth.guild_id for wealth in wallets],
+        [wealth.wallet for wealth in wallets],
+        [wealth.bank for wealth in wallets],
+        [wealth.tokens for wealth in wallets],
+        [wealth.multiplier for wealth in wallets],
+    )
+
+
+async def get_guild_wallets(bot: WorstBot, guild_id: int) -> dict[int, Wealth]:
+    """Returns a guild's wallets by member id, streaming them from the database the first time the guild is used"""
+    if (wallets := bot.economy.get(guild_id)) is not None:
+        return wallets
+
+    async with guild_lock(guild_id):
+        if (wallets := bot.economy.get(guild_id)) is not None:  # loaded by a concurrent lookup while waiting
+            return wallets
+
+        wallets = {}
+        async with bot.transaction() as conn:
+            load_wallets = await bot.prepared(conn, "economy.load_wallets")
+            async for row in load_wallets.cursor(guild_id, prefetch=LOAD_PREFETCH):
+                # a wallet still referenced since its guild was evicted may hold changes the database hasn't seen
+                live = _live_wallets.get(bot.pair(guild_id, row["user_id"]))
+                wallets[row["user_id"]] = live or track(bot, Wealth(*row))
+        bot.economy[guild_id] = wallets
+        _log.debug(f"Loaded {len(wallets)} wallets for guild {guild_id}")
+
+    return wallets
+
+
 async def get_wealth(bot: WorstBot, guild: Guild, user: Member) -> Wealth:
-    wealth: Wealth
-    paired_id = bot.pair(guild.id, user.id)
-    if wealth := bot.economy.get(paired_id):
-        _log.debug(
-            f"{wealth.member_id} cache hit",
-        )
+    wallets = await get_guild_wallets(bot, guild.id)
+    if wealth := wallets.get(user.id):
         return wealth
 
-    row = await bot.fetchrow(
-        "SELECT user_id, guild_id, wallet, bank, tokens, multiplier FROM economy WHERE user_id = $1 AND guild_id = $2",
-        user.id,
-        guild.id,
-    )
-    if not row:
-        await bot.execute(
-            "INSERT INTO economy(user_id, guild_id) VALUES ($1, $2) ON CONFLICT DO NOTHING", user.id, guild.id
-        )
-        wealth = Wealth(user.id, guild.id)
-        _log.debug(
-            f"New user: {wealth.member_id}",
-        )
-    else:
-        wealth = Wealth(*row)
-        _log.debug(
-            f"{wealth.member_id} cache miss",
-        )
-    bot.economy[paired_id] = wealth
+    async with wallet_lock(guild.id, user.id):
+        if not (wealth := wallets.get(user.id) or _live_wallets.get(bot.pair(guild.id, user.id))):
+            wealth = track(bot, Wealth(user.id, guild.id))
+            bot.ledger.record(wealth)
+            _log.debug(
+                f"New user: {wealth.member_id}",
+            )
+        wallets[user.id] = wealth
+
+    return wealth
 
+
+def track(bot: WorstBot, wealth: Wealth) -> Wealth:
+    _live_wallets[bot.pair(wealth.guild_id, wealth.member_id)] = wealth
     return wealth
+
+
+class Ledger:
+    """
+    Write-behind journal of wallet balances and the transaction rows that explain them
+
+    Repeated changes to a wallet coalesce into its latest balance, and each flush writes
+    the pending balances and transactions in one database transaction so neither is stored without the other.
+    """
+
+    def __init__(self, bot: WorstBot):
+        self.bot = bot
+        self.wallets: dict[int, Wealth] = {}
+        self.transactions: list[Transaction] = []
+        self.lock = Lock()
+        self.early_flush: Optional[Task] = None
+
+    def __len__(self) -> int:
+        return len(self.wallets) + len(self.transactions)
+
+    def record(self, *wallets: Wealth, transaction: Optional[Transaction] = None) -> None:
+        for wealth in wallets:
+            self.wallets[self.bot.pair(wealth.guild_id, wealth.member_id)] = wealth
+        if transaction:
+            self.transactions.append(transaction)
+        if len(self) >= LEDGER_FLUSH_THRESHOLD and not self.lock.locked():
+            if self.early_flush is None or self.early_flush.done():
+                self.early_flush = self.bot.loop.create_task(self.safe_flush())
+
+    async def flush(self) -> None:
+        """Writes every pending balance and transaction in a single database transaction"""
+        async with self.lock:
+            if not self.wallets and not self.transactions:
+                return
+            pending, self.wallets = self.wallets, {}
+            transactions, self.transactions = self.transactions, []
+            wallets = list(pending.values())
+            try:
+                async with self.bot.transaction() as conn:
+                    if wallets:
+                        flush_wallets = await self.bot.prepared(conn, "economy.flush_wallets")
+                        await flush_wallets.fetchval(*wallet_columns(wallets))
+                    if transactions:
+                        flush_transactions = await self.bot.prepared(conn, "economy.flush_transactions")
+                        await flush_transactions.fetchval(*transaction_columns(transactions))
+            except BaseException:  # includes cancellation, nothing may be dropped on shutdown
+                for key, wealth in pending.items():
+                    self.wallets.setdefault(key, wealth)
+                self.transactions[:0] = transactions
+                raise
+        _log.debug(f"Flushed {len(wallets)} wallets and {len(transactions)} transactions")
+
+    async def detach(self, *wallets: Wealth) -> tuple[list[Wealth], list[Transaction]]:
+        """Takes wallets and their transactions out of the journal, after any running flush, to be written directly"""
+        async with self.lock:
+            keys = {self.bot.pair(wealth.guild_id, wealth.member_id) for wealth in wallets}
+            pending = [wealth for wealth in (self.wallets.pop(key, None) for key in keys) if wealth is not None]
+            transactions, self.transactions = partition(
+                self.transactions, lambda transaction: self.bot.pair(transaction.guild_id, transaction.user_id) in keys
+            )
+            return pending, transactions
+
+    async def safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            _log.exception("Failed to flush economy ledger", exc_info=e)
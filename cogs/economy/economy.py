@@ -2,14 +2,15 @@ from __future__ import annotations
 
 from typing import Literal, TYPE_CHECKING
 from datetime import time
+from asyncio import Semaphore, gather, shield
 import random
 
 import discord
 from discord import app_commands, Interaction
 from discord.ext import commands, tasks
 
-from modules import EmbedGen, Paginators, Graphs, Constants
-from ._utils import Wealth, get_wealth
+from modules import Cache, EmbedGen, Paginators, Graphs, Constants
+from ._utils import ECONOMY_CACHE_GUILDS, LEDGER_FLUSH_INTERVAL, STATEMENTS, Ledger, Wealth, get_wealth
 
 if TYPE_CHECKING:
     from WorstBot import WorstBot
@@ -21,6 +22,7 @@ class Economy(commands.GroupCog, name="economy"):
     CONVERSION_MIN = 0.05
     CONVERSION_WEIGHTS = {"crash": 0.005, "decrease": 0.5, "increase": 0.5, "boom": 0.005}
     conversion_rate: float = 0.25
+    NAME_FETCH_CONCURRENCY = 5
 
     transfer_group = app_commands.Group(name="transfer", description="Transfer money", guild_only=True)
     gambling_group = app_commands.Group(name="gamble", description="Gamble money", guild_only=True)
@@ -28,7 +30,8 @@ class Economy(commands.GroupCog, name="economy"):
     def __init__(self, bot: WorstBot):
         self.bot = bot
         self.logger = self.bot.logger.getChild(self.qualified_name)
-        self.bot.economy: dict[int, Wealth] = {}
+        self.bot.economy: Cache.LRUCache[int, dict[int, Wealth]] = Cache.LRUCache(ECONOMY_CACHE_GUILDS)
+        self.bot.ledger = Ledger(bot)
 
     async def cog_load(self) -> None:
         if not await self.bot.execute("SELECT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'recipient_type')"):
@@ -38,9 +41,12 @@ class Economy(commands.GroupCog, name="economy"):
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS economy(user_id BIGINT, guild_id BIGINT, wallet FLOAT DEFAULT 0.0, bank FLOAT DEFAULT 0.0, tokens FLOAT DEFAULT 0.0, multiplier FLOAT DEFAULT 1.0, PRIMARY KEY (user_id, guild_id))"
         )
+        await self.bot.execute("CREATE INDEX IF NOT EXISTS economy_guild_id ON economy(guild_id)")
         await self.bot.execute(
             "CREATE TABLE IF NOT EXISTS transactions(user_id BIGINT, recipient recipient_type, recipient_id BIGINT DEFAULT 0, amount FLOAT, timestamp timestamptz)"
         )
+        for name, sql in STATEMENTS.items():
+            self.bot.register_statement(name, sql)
 
         self.conversion_rate = (
             await self.bot.fetchval(
@@ -50,25 +56,17 @@ class Economy(commands.GroupCog, name="economy"):
         )
 
         self.logger.debug(f"Conversion rate: {self.conversion_rate}")
-        self.load_economy.start()
         self.create_conversion_rate.start()
+        self.flush_ledger.start()
         await self.create_conversion_rate()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
         self.create_conversion_rate.cancel()
+        self.flush_ledger.cancel()
+        await self.bot.ledger.flush()
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
-    @tasks.loop(count=1)
-    async def load_economy(self):
-        self.logger.debug("Loading economy data")
-        economy = await self.bot.fetch("SELECT user_id, guild_id, wallet, bank, tokens, multiplier FROM economy")
-        for user_id, guild_id, wallet, bank, tokens, multiplier in economy:
-            self.logger.debug(f"{user_id} {guild_id} {wallet} {bank} {tokens} {multiplier}")
-            self.bot.economy[self.bot.pair(guild_id, user_id)] = Wealth(
-                member_id=user_id, guild_id=guild_id, wallet=wallet, bank=bank, tokens=tokens, multiplier=multiplier
-            )
-
     @tasks.loop(time=time(1, 0))
     async def create_conversion_rate(self):
         conversion_rate = random.choices(list(self.CONVERSION_WEIGHTS.keys()), list(self.CONVERSION_WEIGHTS.values()))[
@@ -89,11 +87,34 @@ class Economy(commands.GroupCog, name="economy"):
         )
         self.logger.debug(f"Conversion rate changed to {self.conversion_rate * 100:.2f}%")
 
-    @load_economy.before_loop
+    @tasks.loop(seconds=LEDGER_FLUSH_INTERVAL)
+    async def flush_ledger(self):
+        # shielded so cancelling the loop on unload can't abort a write, the final flush waits on the ledger lock
+        await shield(self.bot.ledger.safe_flush())
+
     @create_conversion_rate.before_loop
     async def before_ready(self):
         await self.bot.wait_until_ready()
 
+    async def resolve_names(self, guild: discord.Guild, user_ids: list[int]) -> dict[int, str]:
+        """Names users from the member and user caches, fetching the rest a few at a time"""
+        names = {}
+        missing = []
+        for user_id in user_ids:
+            if user := guild.get_member(user_id) or self.bot.get_user(user_id):
+                names[user_id] = str(user)
+            else:
+                missing.append(user_id)
+
+        semaphore = Semaphore(self.NAME_FETCH_CONCURRENCY)
+
+        async def fetch_name(user_id: int) -> None:
+            async with semaphore:
+                names[user_id] = str(await self.bot.maybe_fetch_user(user_id))
+
+        await gather(*(fetch_name(user_id) for user_id in missing))
+        return names
+
     @app_commands.command(name="leaderboard")
     async def leaderboard(self, interaction: Interaction):
         """Check how you stack up against your friends on the leaderboard
@@ -101,23 +122,23 @@ class Economy(commands.GroupCog, name="economy"):
         :param interaction:
         :return:
         """
+        await interaction.response.defer(ephemeral=True)
+        await self.bot.ledger.safe_flush()
         economy = await self.bot.fetch(
-            "SELECT user_id, wallet+bank as wealth FROM economy WHERE guild_id = $1 ORDER BY wealth DESC LIMIT 600",
+            "SELECT user_id, wallet+bank as wealth FROM economy WHERE guild_id = $1 AND wallet+bank > 0 ORDER BY wealth DESC LIMIT 600",
             interaction.guild_id,
         )
-        embeds = EmbedGen.EmbedFieldList(
+        names = await self.resolve_names(interaction.guild, [user_id for user_id, _ in economy])
+        embeds = EmbedGen.LazyEmbedFieldList(
+            economy,
+            lambda i, row: EmbedGen.EmbedField(
+                name=f"{i + 1}: {names[row['user_id']]}", value=f"W${row['wealth']:,}", inline=False
+            ),
             title="Economy Leaderboard",
-            fields=[
-                EmbedGen.EmbedField(
-                    name=f"{i + 1}: {await self.bot.maybe_fetch_user(user_id)}", value=f"W${wealth:,}", inline=False
-                )
-                for i, (user_id, wealth) in enumerate(economy)
-                if wealth > 0
-            ],
             max_fields=5,
         )
         view = Paginators.ButtonPaginatedEmbeds(embed_list=embeds)
-        await interaction.response.send_message(view=view, embed=embeds[0], ephemeral=True)
+        await interaction.followup.send(view=view, embed=embeds[0], ephemeral=True)
         view.response = await interaction.original_response()
 
     @app_commands.command(name="stats")
@@ -141,14 +162,7 @@ class Economy(commands.GroupCog, name="economy"):
         """
         await interaction.response.defer(ephemeral=True)
         user = await get_wealth(self.bot, interaction.guild, interaction.user)
-        amount = min(amount, user.wallet)
-
-        await user.to_tokens(self.bot, amount, self.conversion_rate)
-        await self.bot.execute(
-            "INSERT INTO transactions(user_id, recipient, amount, timestamp) VALUES($1, 'ascend', $2, now()::timestamptz)",
-            interaction.user.id,
-            amount * self.conversion_rate,
-        )
+        amount = await user.to_tokens(self.bot, amount, self.conversion_rate)
 
         await interaction.followup.send(
             f"Successfully converted W${amount:,.2f} to {amount * self.conversion_rate:,.2f} tokens", ephemeral=True
@@ -168,15 +182,7 @@ class Economy(commands.GroupCog, name="economy"):
         """
         owner = await get_wealth(self.bot, interaction.guild, interaction.user)
         recipient = await get_wealth(self.bot, interaction.guild, user)
-        amount = min(amount, owner.wallet)
-
-        await owner.to_user(self.bot, amount, recipient)
-        await self.bot.execute(
-            "INSERT INTO transactions(user_id, recipient, recipient_id, amount, timestamp) VALUES($1, 'transfer', $2, $3, now()::timestamptz)",
-            interaction.user.id,
-            user.id,
-            amount,
-        )
+        amount = await owner.to_user(self.bot, amount, recipient)
 
         await interaction.response.send_message(
             f"Successfully gifted W${amount:,.2f} to {user.mention}", ephemeral=True
@@ -192,14 +198,7 @@ class Economy(commands.GroupCog, name="economy"):
         :return:
         """
         user = await get_wealth(self.bot, interaction.guild, interaction.user)
-        amount = min(amount, user.wallet)
-
-        await user.to_bank(self.bot, amount)
-        await self.bot.execute(
-            "INSERT INTO transactions(user_id, recipient, amount, timestamp) VALUES($1, 'deposit', $2, now()::timestamptz)",
-            interaction.user.id,
-            amount,
-        )
+        amount = await user.to_bank(self.bot, amount)
 
         await interaction.response.send_message(
             f"Successfully deposited W${amount:,.2f} into your bank account", ephemeral=True
@@ -215,14 +214,7 @@ class Economy(commands.GroupCog, name="economy"):
         :return:
         """
         user = await get_wealth(self.bot, interaction.guild, interaction.user)
-        amount = min(amount, user.bank)
-
-        await user.to_wallet(self.bot, amount)
-        await self.bot.execute(
-            "INSERT INTO transactions(user_id, recipient, amount, timestamp) VALUES($1, 'withdraw', $2, now()::timestamptz)",
-            interaction.user.id,
-            amount,
-        )
+        amount = await user.to_wallet(self.bot, amount)
 
         await interaction.response.send_message(
             f"Successfully withdrew W${amount:,.2f} from your bank account", ephemeral=True
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-from asyncio import sleep
-from collections import deque
+from asyncio import BoundedSemaphore, Task, create_task, gather, sleep, wait
 from enum import Enum
-from random import choices, randint
+from random import randint, shuffle
 from typing import TYPE_CHECKING
 
 import discord
@@ -17,7 +16,11 @@ if TYPE_CHECKING:
     from discord import Emoji, Guild
     from WorstBot import WorstBot
     from ._utils import Wealth
-    from typing import Optional
+    from typing import Awaitable, Iterable, Optional
+
+
+FANOUT_CONCURRENCY = 5  # message edits in flight at once per table
+PLAYER_COUNT_DELAY = 1.5  # seconds player count changes are collected before the lobby messages are edited
 
 
 class Games(Enum):
@@ -89,24 +92,101 @@ class Player:
         self.view: Optional[Lobby | Game] = None
 
 
-def blackjack_embed(game: GameManager, cards: list[Emoji]) -> EmbedGen.FullEmbed:
-    score = 0
+class CardRegistry:
+    """
+    Card emoji indexed by compact int ids, built once the bot's custom emoji are loaded
+
+    :param custom_emoji: Emoji to pick the card_<rank>_... and back_card emoji from
+    """
+
+    __slots__ = ("emoji", "values", "back")
+
+    def __init__(self, custom_emoji: list[Emoji]):
+        cards = sorted(
+            (
+                emoji
+                for emoji in custom_emoji
+                if emoji.name.startswith("card_") and emoji.name.split("_")[1] in Cards.__members__
+            ),
+            key=lambda emoji: emoji.name,
+        )
+        self.emoji: tuple[str, ...] = tuple(str(emoji) for emoji in cards)
+        self.values: tuple[int, ...] = tuple(Cards[emoji.name.split("_")[1]].value for emoji in cards)
+        self.back: str = next((str(emoji) for emoji in custom_emoji if emoji.name == "back_card"), "\U00002753")
+
+    def __len__(self) -> int:
+        return len(self.emoji)
+
+    def render(self, cards: Iterable[int]) -> str:
+        return "".join(self.emoji[card] for card in cards)
+
+
+class Shoe:
+    """Shuffled cards dealt without replacement, reshuffled once empty"""
+
+    __slots__ = ("registry", "decks", "cards")
+
+    def __init__(self, registry: CardRegistry, decks: int = 1):
+        self.registry = registry
+        self.decks = decks
+        self.cards: list[int] = []
+        self.shuffle()
+
+    def shuffle(self) -> None:
+        self.cards = list(range(len(self.registry))) * self.decks
+        shuffle(self.cards)
 
-    for card in cards:
-        name = card.name.split("_")[1]
-        score += Cards[name].value
+    def draw(self) -> int:
+        if not self.cards:
+            self.shuffle()
+        return self.cards.pop()
 
-        if name == "ace" and score > 21:
-            score -= 10
+    def deal(self, count: int = 2) -> Hand:
+        hand = Hand(self.registry)
+        for _ in range(count):
+            hand.add(self.draw())
+        return hand
 
+
+class Hand:
+    """Blackjack hand that keeps its score up to date as cards are added, counting aces low once it would bust"""
+
+    __slots__ = ("registry", "cards", "score", "soft_aces")
+
+    def __init__(self, registry: CardRegistry):
+        self.registry = registry
+        self.cards: list[int] = []
+        self.score: int = 0
+        self.soft_aces: int = 0
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def __str__(self) -> str:
+        return self.registry.render(self.cards)
+
+    def add(self, card: int) -> int:
+        value = self.registry.values[card]
+        self.cards.append(card)
+        self.score += value
+        if value == Cards.ace.value:
+            self.soft_aces += 1
+        while self.score > 21 and self.soft_aces:
+            self.score -= 10
+            self.soft_aces -= 1
+        return self.score
+
+
+def blackjack_embed(game: GameManager, hand: Hand) -> EmbedGen.FullEmbed:
     return EmbedGen.FullEmbed(
         title="Blackjack",
         fields=[
-            EmbedGen.EmbedField(name="Your Hand", value="".join(f"<:{card.name}:{card.id}>" for card in cards)),
-            EmbedGen.EmbedField(name="Your Score", value=f"{score}"),
-            EmbedGen.EmbedField(name="Dealer's Hand", value=f"{game.dealer[0]}{game.card_back}"),
+            EmbedGen.EmbedField(name="Your Hand", value=str(hand)),
+            EmbedGen.EmbedField(name="Your Score", value=f"{hand.score}"),
+            EmbedGen.EmbedField(
+                name="Dealer's Hand", value=f"{game.shoe.registry.emoji[game.dealer.cards[0]]}{game.shoe.registry.back}"
+            ),
         ],
-        extras={"score": score},
     )
 
 
@@ -116,6 +196,10 @@ class GameManager:
         self.bot: WorstBot = bot
         self.state: GameState = GameState.waiting
         self.players: list[Player] = [owner]
+        self.logger = bot.logger.getChild(f"gambling.{mode.name}")
+        self.fanout = BoundedSemaphore(FANOUT_CONCURRENCY)
+        self.player_count_task: Optional[Task] = None
+        self.player_count_dirty: bool = False
 
     async def add_player(self, wealth: Wealth, bet: int) -> Player:
         player = Player(wealth, bet)
@@ -134,65 +218,102 @@ class GameManager:
         await self.update_player_count()
         return
 
+    def lobby_embed(self) -> EmbedGen.FullEmbed:
+        return EmbedGen.FullEmbed(
+            title=f"{self.mode.name.title()} Lobby",
+            fields=[EmbedGen.EmbedField(name="Players", value=str(len(self.players)), inline=True)],
+        )
+
+    async def broadcast(self, edits: Iterable[Awaitable]) -> None:
+        """Runs message edits concurrently, a few at a time, so one failed edit doesn't hold up the rest"""
+
+        async def limited(edit: Awaitable):
+            async with self.fanout:
+                return await edit
+
+        for result in await gather(*(limited(edit) for edit in edits), return_exceptions=True):
+            if isinstance(result, Exception):
+                self.logger.warning(f"Failed to update a player's message: {result!r}")
+
+    async def broadcast_edit(self, **kwargs) -> None:
+        """Applies the same edit to every player's message, skipping players whose message was never sent"""
+        await self.broadcast(
+            player.view.response.edit(**kwargs) for player in self.players if player.view and player.view.response
+        )
+
     async def update_player_count(self) -> None:
-        player_count = str(len(self.players))
-        for player in self.players:
-            if not player.view:
-                continue
-            embed = player.view.response.embeds[0].to_dict()
-            embed["fields"][0]["value"] = player_count
-            await player.view.response.edit(embed=discord.Embed.from_dict(embed))
+        self.player_count_dirty = True
+        if self.player_count_task is None or self.player_count_task.done():
+            self.player_count_task = create_task(self.push_player_count())
+
+    async def push_player_count(self) -> None:
+        """Edits every lobby message once per window, however many players joined or left during it"""
+        while True:
+            await sleep(PLAYER_COUNT_DELAY)
+            self.player_count_dirty = False
+            if self.state is not GameState.waiting:
+                return
+            await self.broadcast_edit(embed=self.lobby_embed())
+            if not self.player_count_dirty:
+                return
+
+    async def present(self, player: Player, view: Game, embed: discord.Embed) -> None:
+        """Swaps a player's lobby message for their game view, leaving the player untouched if the edit fails"""
+        view.response = await player.view.response.edit(embed=embed, view=view)
+        player.view.stop()
+        player.view = view
+        player.state = PlayerState.playing
+
+    def drop_unseated(self) -> None:
+        """Removes players whose game view couldn't be shown, their bets are only taken once the game ends"""
+        for player in [player for player in self.players if not isinstance(player.view, Game)]:
+            self.logger.debug(f"Removing {player.wealth.member_id}, their game view could not be shown")
+            if player.view:
+                player.view.stop()
+            self.players.remove(player)
+        if not self.players:
+            self.state = GameState.cancelled
 
     async def start(self, interaction: Interaction):
         self.state = GameState.playing
+        if self.player_count_task is not None and not self.player_count_task.done():
+            # the lobby count is stale once the game starts, drop it rather than wait out its delay
+            self.player_count_task.cancel()
+            await wait({self.player_count_task})  # settled before the game views go out, so it can't overwrite them
 
         match self.mode:
             case Games.blackjack:
-                self.cards: deque[Emoji] = deque(
-                    choices([emoji for emoji in self.bot.custom_emoji if emoji.name.startswith("card_")], k=52)
-                )
-                card_back: list = [emoji for emoji in self.bot.custom_emoji if emoji.name == "back_card"]
-                self.card_back: Emoji | str = "\U00002753" if not card_back else card_back[0]
+                self.shoe: Shoe = Shoe(self.bot.card_registry)
+                self.dealer: Hand = self.shoe.deal()
 
-                self.dealer: list[Emoji] = [self.cards.pop(), self.cards.pop()]
-
-                for player in self.players:
-                    cards = [self.cards.pop(), self.cards.pop()]
-
-                    view = Blackjack(self, player, cards)
-                    embed = blackjack_embed(self, cards)
-
-                    response = await player.view.response.edit(embed=embed, view=view)
-                    view.response = response
-
-                    player.view = view
-                    player.state = PlayerState.playing
+                hands = [self.shoe.deal() for _ in self.players]
+                await self.broadcast(
+                    self.present(player, Blackjack(self, player, hand), blackjack_embed(self, hand))
+                    for player, hand in zip(self.players, hands)
+                )
+                self.drop_unseated()
 
             case Games.roulette:
                 number = randint(0, 36)
                 colour = next(colour for colour in RouletteColours if number in colour.value)
-                for player in self.players:
-                    view = Roulette(self, player, (number, colour))
-                    player_embed = EmbedGen.FullEmbed(
-                        title="Roulette",
-                        image="https://cdnl.iconscout.com/lottie/premium/thumb/roulette-wheel-5290230-4464271.gif",
-                    )
-
-                    response = await player.view.response.edit(embed=player_embed, view=view)
-                    view.response = response
-
-                    player.view = view
-                    player.state = PlayerState.playing
+                player_embed = EmbedGen.FullEmbed(
+                    title="Roulette",
+                    image="https://cdnl.iconscout.com/lottie/premium/thumb/roulette-wheel-5290230-4464271.gif",
+                )
+                await self.broadcast(
+                    self.present(player, Roulette(self, player, (number, colour)), player_embed)
+                    for player in self.players
+                )
+                self.drop_unseated()
 
             case _:
                 raise NotImplementedError(f"Game {self.mode.name} not implemented")
 
     async def cancel(self, interaction: Interaction):
         self.state = GameState.cancelled
-        for player in self.players:
-            await player.view.response.edit(
-                view=None, embed=None, content="The game has been cancelled by the host", delete_after=30
-            )
+        await self.broadcast_edit(
+            view=None, embed=None, content="The game has been cancelled by the host", delete_after=30
+        )
         await interaction.response.send_message("The game has been cancelled", ephemeral=True)
 
 
@@ -247,26 +368,22 @@ class Game(Paginators.BaseView):
 
     async def on_timeout(self) -> None:
         self.game.state = GameState.cancelled
+        await self.game.broadcast_edit(view=None, embed=None, content="The game has been cancelled due to inactivity")
         for player in self.game.players:
-            await player.view.response.edit(
-                view=None, embed=None, content="The game has been cancelled due to inactivity"
-            )
             player.view.stop()
 
 
 class Blackjack(Game):
-    def __init__(self, game: GameManager, player: Player, cards: list[Emoji]):
+    def __init__(self, game: GameManager, player: Player, hand: Hand):
         super().__init__(game, player)
-        self.cards: list[Emoji] = cards
-        self.score = sum(Cards[card.name.split("_")[1]].value for card in cards)
+        self.hand: Hand = hand
 
     @ui.button(label="Hit", style=discord.ButtonStyle.green)
     async def hit(self, interaction: Interaction, button: ui.Button):
-        self.cards.append(self.game.cards.pop())
-        embed = blackjack_embed(self.game, self.cards)
-        self.score = embed.extras.get("score")
+        self.hand.add(self.game.shoe.draw())
+        embed = blackjack_embed(self.game, self.hand)
 
-        if self.score <= 21:
+        if self.hand.score <= 21:
             return await interaction.response.edit_message(embed=embed)
 
         for children in self.children:
@@ -313,18 +430,17 @@ class Blackjack(Game):
 
     async def game_end(self, interaction: Interaction):
         self.game.state = GameState.finished
-        if sum(Cards[card.name.split("_")[1]].value for card in self.game.dealer) < 17:
-            self.game.dealer.append(self.game.cards.pop())
-        dealer_score = sum(Cards[card.name.split("_")[1]].value for card in self.game.dealer)
+        if self.game.dealer.score < 17:
+            self.game.dealer.add(self.game.shoe.draw())
+        dealer_score = self.game.dealer.score
         if dealer_score > 21:
             dealer_score = 0
         winners = [
             player
             for player in self.game.players
-            if player.state is PlayerState.sticking
-            and sum(Cards[card.name.split("_")[1]].value for card in player.view.cards) > dealer_score
+            if player.state is PlayerState.sticking and player.view.hand.score > dealer_score
         ]
-        winners = sorted(winners, key=lambda player: (-player.view.score, len(player.view.cards)))
+        winners = sorted(winners, key=lambda player: (-player.view.hand.score, len(player.view.hand)))
         winner = winners[0] if winners else None
 
         embed = EmbedGen.FullEmbed(
@@ -336,21 +452,17 @@ class Blackjack(Game):
                 ),
                 EmbedGen.EmbedField(
                     name="Winning Hand",
-                    value=(
-                        "".join(str(card) for card in winner.view.cards)
-                        if winner
-                        else "".join(str(card) for card in self.game.dealer)
-                    ),
+                    value=str(winner.view.hand) if winner else str(self.game.dealer),
                 ),
                 EmbedGen.EmbedField(name="Payout", value=f"W${winner.bet * 2 if winner else '0'}"),
             ],
         )
         for player in self.game.players:
             await player.wealth.punish(interaction.client, player.bet)
-            await player.view.response.edit(embed=embed, view=None, content=None)
             player.view.stop()
         if winner:
-            await winners[0].wealth.reward(interaction.client, winners[0].bet * 2)
+            await winner.wealth.reward(interaction.client, winner.bet * 2)
+        await self.game.broadcast_edit(embed=embed, view=None, content=None)
 
 
 class Roulette(Game):
@@ -470,8 +582,8 @@ class Roulette(Game):
                 )
             ],
         )
+        await self.game.broadcast_edit(embed=embed, view=None, content=None)
         for player in self.game.players:
-            await player.view.response.edit(embed=embed, view=None, content=None)
             player.view.stop()
 
         self.game.state = GameState.finished
@@ -483,6 +595,7 @@ class Gambling(commands.GroupCog, name="gambling"):
         self.bot = bot
         self.logger = self.bot.logger.getChild(self.qualified_name)
         self.games: dict[Guild, dict[Games:GameManager]] = {}
+        self.bot.card_registry = CardRegistry(self.bot.custom_emoji)  # empty until the emoji load finishes
 
     async def cog_load(self) -> None:
         self.logger.info(f"{self.qualified_name} cog loaded")
@@ -490,6 +603,11 @@ class Gambling(commands.GroupCog, name="gambling"):
     async def cog_unload(self) -> None:
         self.logger.info(f"{self.qualified_name} cog unloaded")
 
+    @commands.Cog.listener()
+    async def on_emoji_loaded(self):
+        self.bot.card_registry = CardRegistry(self.bot.custom_emoji)
+        self.logger.debug(f"Registered {len(self.bot.card_registry)} cards")
+
     @app_commands.command(name="start")
     async def start_lobby(self, interaction: Interaction, game: Games, bet: app_commands.Range[int, 100, 100_000]):
         """Start a gambling lobby using WorstCoin
@@ -520,11 +638,7 @@ class Gambling(commands.GroupCog, name="gambling"):
         self.games[interaction.guild][game] = game = GameManager(game, self.bot, player)
 
         view = HostLobby(game, player)
-        embed = EmbedGen.FullEmbed(
-            title=f"{game.mode.name.title()} Lobby",
-            fields=[EmbedGen.EmbedField(name="Players", value="1", inline=True)],
-        )
-        await interaction.response.send_message(view=view, embed=embed, ephemeral=True)
+        await interaction.response.send_message(view=view, embed=game.lobby_embed(), ephemeral=True)
         view.response = await interaction.original_response()
         player.view = view
 
@@ -570,13 +684,9 @@ class Gambling(commands.GroupCog, name="gambling"):
 
         player = await self.games[interaction.guild][game].add_player(wealth, bet)
         view = GuestLobby(self.games[interaction.guild][game], player)
-        embed = EmbedGen.FullEmbed(
-            title=f"{game.name.title()} Lobby",
-            fields=[
-                EmbedGen.EmbedField(name="Players", value=len(self.games[interaction.guild][game].players), inline=True)
-            ],
+        await interaction.response.send_message(
+            view=view, embed=self.games[interaction.guild][game].lobby_embed(), ephemeral=True
         )
-        await interaction.response.send_message(view=view, embed=embed, ephemeral=True)
         view.response = await interaction.original_response()
         player.view = view
 
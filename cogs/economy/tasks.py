@@ -49,7 +49,7 @@ class KeypadTask(Task):
             title="Task Complete",
             text=f"Task Successful, W${self.amount * self.wealth.multiplier} has been added to your wallet",
         )
-        await self.wealth.reward(interaction.client, self.amount, use_multiplier=True)
+        await self.wealth.reward(interaction.client, self.amount, use_multiplier=True, transaction="work")
         await interaction.response.edit_message(view=None, embed=embed)
 
 
@@ -59,7 +59,7 @@ class TickTask(Task):
 
     @ui.button(emoji="\U00002705", style=discord.ButtonStyle.green, row=0)
     async def tick(self, interaction: Interaction, button: ui.Button):
-        await self.wealth.reward(interaction.client, self.amount, use_multiplier=True)
+        await self.wealth.reward(interaction.client, self.amount, use_multiplier=True, transaction="work")
         await interaction.response.edit_message(
             view=None,
             embed=None,
@@ -69,7 +69,7 @@ class TickTask(Task):
 
     @ui.button(emoji="\U0000274c", style=discord.ButtonStyle.red, row=0)
     async def cross(self, interaction: Interaction, button: ui.Button):
-        await self.wealth.punish(interaction.client, self.amount)
+        await self.wealth.punish(interaction.client, self.amount, transaction="work")
         await interaction.response.edit_message(
             view=None, embed=None, content=f"Task Failed, W${self.amount} has been removed from your wallet"
         )
@@ -132,11 +132,6 @@ class Tasks(commands.Cog):
         user = await get_wealth(self.bot, interaction.guild, interaction.user)
         view: Task = await choice(self.tasks)(interaction, user)
         await view.wait()
-        await self.bot.execute(
-            "INSERT INTO transactions(user_id, recipient, amount, timestamp) VALUES ($1, 'work', $2, now()::timestamptz)",
-            user.member_id,
-            view.amount,
-        )
 
 
 async def setup(bot):
@@ -2,6 +2,7 @@ from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta, timezone
 from enum import StrEnum, auto
 from typing import Optional, Any
+from functools import partial
 from collections.abc import Mapping
 
 import discord
@@ -202,6 +203,7 @@ class SetDeadline(ui.Modal):
             self.todo.status.value,
             self.todo.id_,
         )
+        interaction.client.dispatch("todo_update", self.todo)
         view = TodoMenu(self.todo)
         await interaction.response.send_message(view=view, embed=create_embed(self.todo), ephemeral=True)
         view.response = await interaction.original_response()
@@ -302,6 +304,7 @@ class TodoMenu(Paginators.BaseView):
             return await interaction.response.send_message("This TODO is locked, please unlock to edit", ephemeral=True)
         self.todo.status = TodoStatus.completed
         await interaction.client.execute("UPDATE todo SET status='completed' WHERE todo_id=$1", self.todo.id_)
+        interaction.client.dispatch("todo_update", self.todo)
         button.disabled = True
         await interaction.response.edit_message(view=self)
 
@@ -335,6 +338,7 @@ class SetFlags(Paginators.BaseView):
             self.todo.id_,
             *asdict(self.todo.flags).values(),
         )
+        interaction.client.dispatch("todo_update", self.todo)
         button.style = BooleanColours[getattr(self.todo.flags, button.label.lower())]
         await interaction.response.edit_message(view=self)
 
@@ -410,6 +414,7 @@ class TodoReminder(Paginators.BaseView):
     async def mark_complete(self, interaction: Interaction, button: ui.Button):
         self.todo.status = TodoStatus.completed
         await interaction.client.execute("UPDATE todo SET status='completed' WHERE todo_id=$1", self.todo.id_)
+        interaction.client.dispatch("todo_update", self.todo)
         button.disabled = True
         self.stop()
         await interaction.response.edit_message(view=self, content=f"{self.todo.name} has been marked as completed")
@@ -439,12 +444,15 @@ class Todos(commands.GroupCog, name="todo"):
         )
         self.bot.tree.add_command(self.context_menu)
         self.todos = {}
-        self.ReminderTask.start()
+        for row in await self.bot.fetch(
+            "SELECT todo_id, owner, deadline FROM todo WHERE status IN ('on_going', 'overdue') AND deadline IS NOT NULL AND silent is FALSE"
+        ):
+            self.schedule(row["todo_id"], row["owner"], row["deadline"])
         self.prepare_views.start()
         self.logger.info(f"{self.qualified_name} cog loaded")
 
     async def cog_unload(self) -> None:
-        self.ReminderTask.stop()
+        self.bot.scheduler.cancel_namespace("todo")
         self.bot.tree.remove_command(self.Context_menu)
         del self.todos
         for view in self.todos:  # type: ui.View
@@ -536,6 +544,7 @@ class Todos(commands.GroupCog, name="todo"):
         :param todo: The TODO to cancel
         """
         await self.bot.execute("UPDATE todo SET status = 'cancelled' WHERE todo_id = $1", todo)
+        self.bot.scheduler.cancel(("todo", todo))
         await interaction.response.send_message("TODO marked as 'cancelled'", ephemeral=True)
 
     @app_commands.command(name="view")
@@ -600,24 +609,21 @@ class Todos(commands.GroupCog, name="todo"):
         fuzzy = [role_name for role_name, _, _ in fuzzy]
         return [app_commands.Choice(name=name, value=todo_id) for todo_id, name in todos if name in fuzzy]
 
-    @tasks.loop(seconds=5, reconnect=True)
-    async def ReminderTask(self):
-        row = await self.bot.fetchrow(
-            "SELECT todo_id, owner FROM todo WHERE status IN ('on_going', 'overdue') AND deadline IS NOT NULL AND silent is FALSE ORDER BY deadline LIMIT 1"
-        )
-        if not row:
-            return
-        owner_id, todo_id = row.get("owner"), row.get("todo_id")
+    def schedule(self, todo_id: int, owner_id: int, deadline: datetime) -> None:
+        self.bot.scheduler.schedule(("todo", todo_id), deadline, partial(self.send_reminder, owner_id, todo_id))
+
+    @commands.Cog.listener()
+    async def on_todo_update(self, todo: Todo):
+        if todo.status in (TodoStatus.on_going, TodoStatus.overdue) and todo.deadline and not todo.flags.silent:
+            self.schedule(todo.id_, todo.owner.id, todo.deadline)
+        else:
+            self.bot.scheduler.cancel(("todo", todo.id_))
 
+    async def send_reminder(self, owner_id: int, todo_id: int) -> None:
         owner = await self.bot.maybe_fetch_user(owner_id)
         todo = await self.get_todo(owner, todo_id)
 
-        if todo.deadline - utcnow() > timedelta(days=7):
-            return
-
         todo.status = TodoStatus.overdue
-        await self.bot.execute("UPDATE todo SET status=$1 WHERE todo_id=$2", todo.status, todo.id_)
-        await discord.utils.sleep_until(todo.deadline)
         embed = create_embed(todo)
         view = TodoReminder(todo)
         message = await owner.send(view=view, embed=embed)
@@ -626,6 +632,7 @@ class Todos(commands.GroupCog, name="todo"):
             todo.status = TodoStatus.expired
         else:
             todo.deadline += timedelta(days=1)
+            self.schedule(todo.id_, owner_id, todo.deadline)
         await self.bot.execute(
             "UPDATE todo SET status=$1, deadline=$2, view_message=$3 WHERE todo_id=$4",
             todo.status,
@@ -634,10 +641,6 @@ class Todos(commands.GroupCog, name="todo"):
             todo.id_,
         )
 
-    @ReminderTask.before_loop
-    async def BeforeReminder(self):
-        await self.bot.wait_until_ready()
-
 
 async def setup(bot):
     await bot.add_cog(Todos(bot))
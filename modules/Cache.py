@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Generic, Hashable, Iterator, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Size bounded mapping that evicts the least recently used entry once full
+
+    :param maxsize: Maximum number of entries held at once
+    :param ttl: Seconds an entry stays valid after being set, None to never expire
+    """
+
+    __slots__ = ("maxsize", "ttl", "stats", "_data")
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            self.stats.misses += 1
+            return default
+
+        if expires < monotonic():
+            del self._data[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        expires = monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def values(self) -> Iterator[V]:
+        return (value for _, value in self._data.values())
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.set(key, value)
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"<LRUCache size={len(self)}/{self.maxsize} ttl={self.ttl} stats={self.stats}>"
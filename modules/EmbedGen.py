@@ -1,7 +1,7 @@
 from discord import Embed as DiscordEmbed, Colour
 from discord.utils import MISSING, utcnow
 from itertools import islice
-from typing import Optional, Any, Mapping, Self
+from typing import Optional, Any, Callable, Mapping, Self, Sequence
 from math import ceil
 from inspect import currentframe, getargvalues
 
@@ -220,6 +220,64 @@ def EmbedFieldList(
     return embed_list
 
 
+class LazyEmbedFieldList(Sequence[Embed]):
+    """
+    List of embeds with {max_fields} number of fields per embed, each page is only built when first accessed.
+
+    :param items: Source items, one per field
+    :param field_factory: Converts (position, item) into an embed field
+    :param author: Embed Author
+    :param title: Embed Title
+    :param max_fields: Number of fields per embed (up to 25)
+    :param colour: Colour of embeds
+    """
+
+    def __init__(
+        self,
+        items: Sequence[Any],
+        field_factory: Callable[[int, Any], EmbedField],
+        author: Optional[dict[str, str]] = None,
+        title: Optional[str] = None,
+        max_fields: int = 25,
+        colour: Optional[Colour] = None,
+    ):
+        self.items = items
+        self.field_factory = field_factory
+        self.author = author
+        self.title = title
+        self.max_fields = min(max_fields, 25)
+        self.colour = colour
+        self._pages: dict[int, Embed] = {}
+
+    def __len__(self) -> int:
+        return max(ceil(len(self.items) / self.max_fields), 1)
+
+    def __getitem__(self, index: int | slice) -> Embed | list[Embed]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("page index out of range")
+        if index not in self._pages:
+            self._pages[index] = self._build_page(index)
+        return self._pages[index]
+
+    def _build_page(self, index: int) -> Embed:
+        start = index * self.max_fields
+        embed = Embed(title=self.title, colour=set_colour(self.colour), timestamp=utcnow())
+        embed.add_fields(
+            [
+                self.field_factory(position, item)
+                for position, item in enumerate(self.items[start : start + self.max_fields], start=start)
+            ]
+        )
+        if self.author:
+            set_author(embed, self.author)
+        embed.set_footer(text=f"Page {index + 1} of {len(self)}")
+        return embed
+
+
 def SimpleEmbedList(
     author: Optional[dict[str, str]] = None,
     title: Optional[list[str] | str] = None,
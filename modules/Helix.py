@@ -0,0 +1,147 @@
+import logging
+from asyncio import Lock, Semaphore, sleep
+from time import time
+from typing import Any, Optional
+
+from aiohttp import ClientError, ClientSession
+
+HELIX_URL = "https://api.twitch.tv/helix/"
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+HELIX_PAGE_SIZE = 100  # helix caps user_id filters and page sizes at 100
+HELIX_CONCURRENCY = 8
+HELIX_RETRIES = 3
+TOKEN_REFRESH_MARGIN = 60 * 60  # seconds before expiry that the app token is renewed
+
+
+def chunked(user_ids: list[int], size: int = HELIX_PAGE_SIZE) -> list[tuple[int, ...]]:
+    return [tuple(user_ids[i : i + size]) for i in range(0, len(user_ids), size)]
+
+
+class HelixClient:
+    """
+    Twitch helix client sharing one app token, pacing requests by the rate limit headers
+
+    :param session: Session requests are made with
+    :param client_id: Twitch application client id
+    :param client_secret: Twitch application secret
+    :param logger: Logger for failed requests
+    :param url: Helix base url, ending in a slash
+    :param token_url: OAuth token endpoint
+    :param backoff: Seconds multiplied by 2**attempt between retries
+    """
+
+    def __init__(
+        self,
+        session: ClientSession,
+        client_id: str,
+        client_secret: str,
+        logger: logging.Logger,
+        *,
+        url: str = HELIX_URL,
+        token_url: str = TOKEN_URL,
+        backoff: float = 1.0,
+    ):
+        self.session = session
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.logger = logger
+        self.url = url
+        self.token_url = token_url
+        self.backoff = backoff
+        self.token: Optional[str] = None
+        self.token_expires: float = 0.0
+        self.token_lock = Lock()
+        self.semaphore = Semaphore(HELIX_CONCURRENCY)
+        self.ratelimit_remaining: int = 1
+        self.ratelimit_reset: float = 0.0
+
+    async def renew_token(self) -> None:
+        async with self.session.post(
+            url=self.token_url,
+            params={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "client_credentials",
+            },
+        ) as response:
+            token = await response.json()
+        self.token = token.get("access_token")
+        self.token_expires = time() + token.get("expires_in", 0)
+
+    async def get_token(self) -> Optional[str]:
+        """Returns the shared app token, renewing it shortly before it expires"""
+        if self.token and time() < self.token_expires - TOKEN_REFRESH_MARGIN:
+            return self.token
+        async with self.token_lock:
+            if not self.token or time() >= self.token_expires - TOKEN_REFRESH_MARGIN:
+                await self.renew_token()
+        return self.token
+
+    async def get(self, endpoint: str, params: list[tuple[str, Any]], retries: int = HELIX_RETRIES) -> Optional[dict]:
+        """GET a helix endpoint, pacing requests by the rate limit headers and retrying failures
+
+        :param endpoint: Path after /helix/
+        :param params: Query parameters, repeated keys allowed
+        :param retries: Attempts made before giving up, a rejected token is renewed once on top of these
+        :return: Decoded json body, None if every attempt failed
+        """
+        attempt, renewed = 0, False
+        while attempt < retries:
+            if attempt:
+                await sleep(self.backoff * 2**attempt)
+            async with self.semaphore:
+                if self.ratelimit_remaining < 1 and self.ratelimit_reset > time():
+                    await sleep(self.ratelimit_reset - time())
+                try:
+                    async with self.session.get(
+                        url=self.url + endpoint,
+                        params=params,
+                        headers={"client-id": self.client_id, "Authorization": f"Bearer {await self.get_token()}"},
+                    ) as response:
+                        if "Ratelimit-Remaining" in response.headers:
+                            self.ratelimit_remaining = int(response.headers["Ratelimit-Remaining"])
+                            self.ratelimit_reset = float(response.headers["Ratelimit-Reset"])
+                        if response.status == 200:
+                            return await response.json()
+                        status = response.status
+                except ClientError as e:
+                    self.logger.warning(f"Helix {endpoint} request failed: {e!r}, attempt {attempt + 1}")
+                    attempt += 1
+                    continue
+            if status == 401 and not renewed:  # token revoked or expired early
+                renewed = True
+                async with self.token_lock:
+                    await self.renew_token()
+                continue
+            self.logger.warning(f"Helix {endpoint} returned {status}, attempt {attempt + 1}")
+            if status != 429 and status < 500:
+                return None
+            attempt += 1
+        return None
+
+    async def fetch_streams(self, user_ids: tuple[int, ...]) -> Optional[list[dict]]:
+        """Returns every live stream for up to 100 users, following helix pagination
+
+        :param user_ids: Twitch user ids to check
+        :return: Stream objects, None if the request failed
+        """
+        streams, cursor = [], None
+        while True:
+            params = [("user_id", user_id) for user_id in user_ids] + [("first", HELIX_PAGE_SIZE)]
+            if cursor:
+                params.append(("after", cursor))
+            page = await self.get("streams", params)
+            if page is None:
+                return None
+            streams.extend(page.get("data", []))
+            cursor = page.get("pagination", {}).get("cursor")
+            if not cursor or not page.get("data"):
+                return streams
+
+    async def fetch_users(self, user_ids: list[int]) -> list[dict]:
+        """Returns the user objects helix could find, 100 ids per request"""
+        users = []
+        for chunk in chunked(user_ids):
+            page = await self.get("users", [("id", user_id) for user_id in chunk])
+            users.extend((page or {}).get("data", []))
+        return users
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timezone
+from itertools import count
+from typing import Awaitable, Callable, Hashable
+
+MAX_SLEEP = 60 * 60  # re-check the clock at least hourly so long waits can't drift
+
+
+class Scheduler:
+    """
+    Heap based timer that runs each job's callback once its deadline passes
+
+    Jobs are keyed by a tuple whose first item is the owning cog's namespace,
+    scheduling an existing key replaces its deadline and callback.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self._heap: list[tuple[datetime, int, Hashable]] = []
+        self._jobs: dict[Hashable, tuple[int, Callable[[], Awaitable[None]]]] = {}
+        self._sequence = count()
+        self._wakeup = asyncio.Event()
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._jobs
+
+    def schedule(self, key: tuple[str, Hashable], when: datetime, callback: Callable[[], Awaitable[None]]) -> None:
+        """Runs callback at when, naive datetimes are treated as UTC
+
+        :param key: (namespace, id) identifying the job
+        :param when: Time the job is due
+        :param callback: Coroutine function called with no arguments
+        """
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        sequence = next(self._sequence)
+        self._jobs[key] = (sequence, callback)
+        heapq.heappush(self._heap, (when, sequence, key))
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._compact()
+        self._wakeup.set()
+
+    def cancel(self, key: tuple[str, Hashable]) -> None:
+        self._jobs.pop(key, None)  # the heap entry is dropped when it reaches the top
+
+    def cancel_namespace(self, namespace: str) -> None:
+        for key in [key for key in self._jobs if key[0] == namespace]:
+            del self._jobs[key]
+
+    def _is_current(self, sequence: int, key: Hashable) -> bool:
+        job = self._jobs.get(key)
+        return job is not None and job[0] == sequence
+
+    def _compact(self) -> None:
+        self._heap = [entry for entry in self._heap if self._is_current(entry[1], entry[2])]
+        heapq.heapify(self._heap)
+
+    def _spawn(self, key: Hashable, callback: Callable[[], Awaitable[None]]) -> None:
+        task = asyncio.create_task(callback(), name=f"scheduler:{key}")
+        self._running.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception():
+            self.logger.exception(f"Scheduled job {task.get_name()} failed", exc_info=task.exception())
+
+    async def run(self) -> None:
+        """Fires every due job concurrently, then sleeps until the next deadline or a new job is scheduled"""
+        while True:
+            self._wakeup.clear()
+            now = datetime.now(timezone.utc)
+            while self._heap:
+                when, sequence, key = self._heap[0]
+                if not self._is_current(sequence, key):
+                    heapq.heappop(self._heap)
+                    continue
+                if when > now:
+                    break
+                heapq.heappop(self._heap)
+                _, callback = self._jobs.pop(key)
+                self._spawn(key, callback)
+
+            timeout = MAX_SLEEP if not self._heap else min((self._heap[0][0] - now).total_seconds(), MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,17 @@
+SNOWFLAKE_BITS = 64
+SNOWFLAKE_MASK = (1 << SNOWFLAKE_BITS) - 1
+
+
+def pair(guild_id: int, member_id: int) -> int:
+    """Packs two 64 bit snowflakes into one exact int key
+
+    :param guild_id: Guild to pair
+    :param member_id: Member to pair
+    :return: combined id
+    """
+    return guild_id << SNOWFLAKE_BITS | member_id
+
+
+def unpair(paired: int) -> tuple[int, int]:
+    """Splits a key made by pair back into its guild and member ids"""
+    return paired >> SNOWFLAKE_BITS, paired & SNOWFLAKE_MASK
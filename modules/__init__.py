@@ -1 +1 @@
-__all__ = ["Constants", "Converters", "EmbedGen", "FFmpeg", "Graphs", "Paginators", "RoleManipulation"]
+__all__ = ["Cache", "Constants", "Converters", "EmbedGen", "FFmpeg", "Graphs", "Paginators", "RoleManipulation", "Scheduler", "Snowflake"]
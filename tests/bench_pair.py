@@ -0,0 +1,38 @@
+"""Compares dict lookup cost for the old Cantor keys, packed int keys and tuple keys
+
+Run with: python -m tests.bench_pair
+"""
+
+import random
+import timeit
+
+from modules import Snowflake
+
+WALLETS = 100_000
+LOOKUPS = 1_000_000
+
+
+def cantor(guild_id: int, member_id: int) -> int:
+    return int((((guild_id + member_id) * (guild_id + member_id + 1)) / 2) + member_id)
+
+
+def main() -> None:
+    rng = random.Random(0)
+    ids = [(rng.getrandbits(63), rng.getrandbits(63)) for _ in range(WALLETS)]
+    queries = [rng.choice(ids) for _ in range(LOOKUPS)]
+    keys = {
+        "cantor float": cantor,
+        "packed int": Snowflake.pair,
+        "tuple": lambda guild_id, member_id: (guild_id, member_id),
+    }
+    for name, make_key in keys.items():
+        table = {make_key(guild_id, member_id): None for guild_id, member_id in ids}
+        collisions = WALLETS - len(table)
+        seconds = timeit.timeit(
+            lambda: [table.get(make_key(guild_id, member_id)) for guild_id, member_id in queries], number=1
+        )
+        print(f"{name:>12}: {seconds / LOOKUPS * 1e9:7.1f} ns/lookup, {collisions} colliding keys")
+
+
+if __name__ == "__main__":
+    main()
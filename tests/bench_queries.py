@@ -0,0 +1,65 @@
+"""Compares per-query latency of the old transaction-wrapped helpers against the transaction-free and prepared paths
+
+Needs a running Postgres, the table it creates is temporary and dropped with the connection.
+Run with: python -m tests.bench_queries [dsn]   (defaults to $BENCH_DSN or postgresql://localhost/postgres)
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+from time import perf_counter
+from typing import Awaitable, Callable
+
+import asyncpg
+
+DEFAULT_DSN = "postgresql://localhost/postgres"
+ROWS = 10_000
+QUERIES = 5_000
+SELECT = "SELECT * FROM bench_sticky WHERE channel=$1"
+UPDATE = "UPDATE bench_sticky SET messageid=$1 WHERE channel=$2"
+
+
+async def measure(name: str, query: Callable[[int], Awaitable]) -> None:
+    for channel in range(100):  # warm up the connection and server side caches
+        await query(channel)
+    timings = []
+    for channel in range(QUERIES):
+        start = perf_counter()
+        await query(channel % ROWS)
+        timings.append(perf_counter() - start)
+    timings.sort()
+    print(
+        f"{name:>28}: median {statistics.median(timings) * 1e6:7.1f} us, "
+        f"p99 {timings[int(len(timings) * 0.99)] * 1e6:7.1f} us"
+    )
+
+
+async def main(dsn: str) -> None:
+    # one connection so every variant pays the same network cost and none of them hides behind pool concurrency
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute("CREATE TEMPORARY TABLE bench_sticky(channel BIGINT PRIMARY KEY, messageid BIGINT)")
+        await conn.copy_records_to_table("bench_sticky", records=[(channel, 0) for channel in range(ROWS)])
+
+        async def fetchrow_in_transaction(channel: int):  # the helpers before the change
+            async with conn.transaction():
+                return await conn.fetchrow(SELECT, channel)
+
+        async def execute_in_transaction(channel: int):
+            async with conn.transaction():
+                return await conn.fetchval(UPDATE, channel, channel)
+
+        select, update = await conn.prepare(SELECT), await conn.prepare(UPDATE)
+        await measure("fetchrow in transaction", fetchrow_in_transaction)
+        await measure("fetchrow", lambda channel: conn.fetchrow(SELECT, channel))
+        await measure("prepared fetchrow", select.fetchrow)
+        await measure("update in transaction", execute_in_transaction)
+        await measure("update", lambda channel: conn.fetchval(UPDATE, channel, channel))
+        await measure("prepared update", lambda channel: update.fetchval(channel, channel))
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else os.environ.get("BENCH_DSN", DEFAULT_DSN)))
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from time import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from modules.Helix import HELIX_PAGE_SIZE, HelixClient, chunked
+
+
+class StubHelix:
+    """Records every request and answers with the next queued response for its path"""
+
+    def __init__(self):
+        self.requests: list[web.Request] = []
+        self.tokens_issued = 0
+        self.responses: dict[str, list[web.Response]] = {}
+        self.rejected_tokens: set[str] = set()
+
+    def queue(self, path: str, *responses: web.Response) -> None:
+        self.responses.setdefault(path, []).extend(responses)
+
+    async def token(self, request: web.Request) -> web.Response:
+        self.tokens_issued += 1
+        return web.json_response({"access_token": f"token-{self.tokens_issued}", "expires_in": 5000000})
+
+    async def helix(self, request: web.Request) -> web.Response:
+        self.requests.append(request)
+        if request.headers["Authorization"].removeprefix("Bearer ") in self.rejected_tokens:
+            return web.json_response({"message": "Invalid OAuth token"}, status=401)
+        queued = self.responses.get(request.match_info["endpoint"])
+        if queued:
+            return queued.pop(0)
+        return web.json_response({"data": [], "pagination": {}})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/oauth2/token", self.token)
+        app.router.add_get("/helix/{endpoint:.+}", self.helix)
+        return app
+
+
+def run(test) -> None:
+    async def runner():
+        stub = StubHelix()
+        async with TestServer(stub.app()) as server, aiohttp.ClientSession() as session:
+            client = HelixClient(
+                session,
+                "client",
+                "secret",
+                logging.getLogger("test_helix"),
+                url=str(server.make_url("/helix/")),
+                token_url=str(server.make_url("/oauth2/token")),
+                backoff=0.01,
+            )
+            await test(stub, client)
+
+    asyncio.run(runner())
+
+
+def test_chunks_user_ids_by_page_size():
+    user_ids = list(range(HELIX_PAGE_SIZE * 2 + 1))
+    chunks = chunked(user_ids)
+    assert [len(chunk) for chunk in chunks] == [HELIX_PAGE_SIZE, HELIX_PAGE_SIZE, 1]
+    assert [user_id for chunk in chunks for user_id in chunk] == user_ids
+
+
+def test_fetch_users_sends_at_most_one_page_of_ids_per_request():
+    async def test(stub: StubHelix, client: HelixClient):
+        await client.fetch_users(list(range(250)))
+        sent = [request.query.getall("id") for request in stub.requests]
+        assert [len(ids) for ids in sent] == [100, 100, 50]
+        assert [int(user_id) for ids in sent for user_id in ids] == list(range(250))
+
+    run(test)
+
+
+def test_fetch_streams_follows_the_cursor():
+    async def test(stub: StubHelix, client: HelixClient):
+        stub.queue(
+            "streams",
+            web.json_response({"data": [{"user_id": "1"}], "pagination": {"cursor": "page-2"}}),
+            web.json_response({"data": [{"user_id": "2"}], "pagination": {}}),
+        )
+        streams = await client.fetch_streams((1, 2))
+        assert [stream["user_id"] for stream in streams] == ["1", "2"]
+        assert [request.query.get("after") for request in stub.requests] == [None, "page-2"]
+        assert all(request.query.getall("user_id") == ["1", "2"] for request in stub.requests)
+
+    run(test)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_rate_limits_and_server_errors(status: int):
+    async def test(stub: StubHelix, client: HelixClient):
+        stub.queue("users", web.Response(status=status), web.json_response({"data": [{"id": "1"}]}))
+        assert await client.get("users", [("id", 1)]) == {"data": [{"id": "1"}]}
+        assert len(stub.requests) == 2
+
+    run(test)
+
+
+def test_gives_up_after_the_retry_budget():
+    async def test(stub: StubHelix, client: HelixClient):
+        stub.queue("users", *(web.Response(status=500) for _ in range(5)))
+        assert await client.get("users", [("id", 1)], retries=3) is None
+        assert len(stub.requests) == 3
+
+    run(test)
+
+
+def test_does_not_retry_client_errors():
+    async def test(stub: StubHelix, client: HelixClient):
+        stub.queue("users", web.Response(status=400), web.json_response({"data": []}))
+        assert await client.get("users", [("id", 1)]) is None
+        assert len(stub.requests) == 1
+
+    run(test)
+
+
+def test_waits_for_ratelimit_reset_when_the_bucket_is_empty():
+    async def test(stub: StubHelix, client: HelixClient):
+        reset = time() + 0.3
+        stub.queue(
+            "users",
+            web.json_response({"data": []}, headers={"Ratelimit-Remaining": "0", "Ratelimit-Reset": str(reset)}),
+        )
+        await client.get("users", [("id", 1)])
+        await client.get("users", [("id", 2)])
+        assert time() >= reset
+        assert len(stub.requests) == 2
+
+    run(test)
+
+
+def test_renews_a_rejected_token_once():
+    async def test(stub: StubHelix, client: HelixClient):
+        stub.rejected_tokens.add("token-1")
+        assert await client.get("users", [("id", 1)], retries=1) == {"data": [], "pagination": {}}
+        assert stub.tokens_issued == 2
+        assert [request.headers["Authorization"] for request in stub.requests] == ["Bearer token-1", "Bearer token-2"]
+
+    run(test)
+
+
+def test_stops_after_a_renewed_token_is_also_rejected():
+    async def test(stub: StubHelix, client: HelixClient):
+        stub.rejected_tokens.update({"token-1", "token-2"})
+        assert await client.get("users", [("id", 1)]) is None
+        assert stub.tokens_issued == 2
+        assert len(stub.requests) == 2
+
+    run(test)
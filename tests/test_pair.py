@@ -0,0 +1,44 @@
+import random
+
+from modules import Snowflake
+
+SAMPLES = 100_000
+MAX_SNOWFLAKE = (1 << 64) - 1
+
+
+def random_snowflakes(rng: random.Random, count: int) -> list[tuple[int, int]]:
+    # mostly real looking 63 bit ids, with the extremes of the 64 bit range mixed in
+    edges = [0, 1, MAX_SNOWFLAKE - 1, MAX_SNOWFLAKE]
+    return [
+        (rng.choice(edges) if rng.random() < 0.01 else rng.getrandbits(63), rng.getrandbits(64))
+        for _ in range(count)
+    ]
+
+
+def test_round_trip():
+    rng = random.Random(0)
+    for guild_id, member_id in random_snowflakes(rng, SAMPLES):
+        assert Snowflake.unpair(Snowflake.pair(guild_id, member_id)) == (guild_id, member_id)
+
+
+def test_keys_are_unique():
+    rng = random.Random(1)
+    ids = set(random_snowflakes(rng, SAMPLES))
+    assert len({Snowflake.pair(guild_id, member_id) for guild_id, member_id in ids}) == len(ids)
+
+
+def test_order_matters():
+    rng = random.Random(2)
+    for guild_id, member_id in random_snowflakes(rng, 1000):
+        if guild_id != member_id:
+            assert Snowflake.pair(guild_id, member_id) != Snowflake.pair(member_id, guild_id)
+
+
+def test_cantor_float_pairing_collided():
+    # the key this replaced, kept here to show why it had to go
+    def cantor(guild_id: int, member_id: int) -> int:
+        return int((((guild_id + member_id) * (guild_id + member_id + 1)) / 2) + member_id)
+
+    guild_id, member_id = 1099836627171430400, 1099821517350637629
+    assert cantor(guild_id, member_id) == cantor(guild_id, member_id + 1)
+    assert Snowflake.pair(guild_id, member_id) != Snowflake.pair(guild_id, member_id + 1)